@@ -4,16 +4,33 @@
 Growing Code Tester - Automated testing suite for Growing Code exercises
 Inspired by libfttester principles
 
-Usage: python3 growingcodetester.py [exercise_number|all]
+Usage: python3 growingcodetester.py [exercise_number|all] [--no-cache]
+       python3 growingcodetester.py batch SUBMISSIONS_DIR [--jobs N]
+       python3 growingcodetester.py serve [--socket PATH]
+       python3 growingcodetester.py queue {enqueue,work,status,results} DB
+       python3 growingcodetester.py stats DB {checks,exercises,...}
+       python3 growingcodetester.py similarity SUBMISSIONS_DIR
+       python3 growingcodetester.py git REPO [--rev REV]
 """
 
 import sys
 import os
 import io
-from typing import List
-import importlib.util
-import subprocess
-import tempfile
+import ast
+import gc
+import math
+import json
+import time
+import types
+import marshal
+import hashlib
+import builtins
+import collections
+import threading
+import contextlib
+import contextvars
+
+__version__ = "1.1.2"
 
 
 class Colors:
@@ -26,27 +43,2132 @@ class Colors:
     WHITE = '\033[97m'
     BOLD = '\033[1m'
     END = '\033[0m'
+    CLEAR = '\033[2J\033[H'
+
+
+# Symbol and colour of a passed/failed verdict
+STATUS_STYLES = {True: ("✅", Colors.GREEN), False: ("❌", Colors.RED)}
 
 
 class TestResult:
-    def __init__(self, name: str, passed: bool, message: str = ""):
-        self.name = name
+    # Large runs hold many results: no __dict__, and the few distinct
+    # check names, exercises and success messages are shared strings
+    __slots__ = ("name", "passed", "message", "duration", "exercise",
+                 "digest", "usage", "_reason")
+
+    def __init__(self, name: str, passed: bool, message: str = "",
+                 duration: float = 0.0, exercise: str = "",
+                 digest: str = "", usage: "ResourceUsage" = None,
+                 reason: str = ""):
+        self.name = sys.intern(name)
         self.passed = passed
-        self.message = message
+        self.message = sys.intern(message) if passed else message
+        self.duration = duration
+        self.exercise = exercise
+        self.digest = digest
+        self.usage = usage
+        self._reason = sys.intern(reason) if reason else ""
 
+    @property
+    def reason(self) -> str:
+        """The message without what varies between runs (student output,
+        line numbers, timings), for failure histograms"""
+        return self._reason or self.message
+
+    def to_dict(self) -> dict:
+        data = {"name": self.name, "passed": self.passed,
+                "message": self.message, "duration": self.duration}
+        if self._reason:
+            data["reason"] = self._reason
+        if self.usage is not None:
+            data["usage"] = self.usage.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TestResult":
+        usage = data.get("usage")
+        return cls(data["name"], data["passed"], data["message"],
+                   data.get("duration", 0.0),
+                   usage=usage and ResourceUsage.from_dict(usage),
+                   reason=data.get("reason", ""))
+
+
+def rusage():
+    """(CPU s, user CPU s, system CPU s, peak RSS KiB) of this thread"""
+    cpu = time.thread_time()
+    try:
+        import resource
+    except ImportError:
+        return cpu, 0.0, 0.0, 0
+    usage = resource.getrusage(getattr(resource, "RUSAGE_THREAD",
+                                       resource.RUSAGE_SELF))
+    # ru_maxrss is in bytes on macOS, KiB elsewhere
+    peak = (usage.ru_maxrss // 1024 if sys.platform == "darwin"
+            else usage.ru_maxrss)
+    return cpu, usage.ru_utime, usage.ru_stime, peak
+
+
+class ResourceUsage:
+    """CPU, wall time, peak RSS and output of the student runs of a result
+
+    cpu is the precise CPU time of the grading thread; the kernel only
+    samples its user/system split at clock ticks, so short runs often
+    show 0 there. Peak RSS is the high-water mark of the grading process
+    (the sandbox worker of the exercise) when the runs ended.
+    """
+
+    __slots__ = ("runs", "cpu", "user", "system", "wall", "peak_rss_kb",
+                 "stdout_bytes")
+
+    def __init__(self, runs: int = 0, cpu: float = 0.0, user: float = 0.0,
+                 system: float = 0.0, wall: float = 0.0,
+                 peak_rss_kb: int = 0, stdout_bytes: int = 0):
+        self.runs = runs
+        self.cpu = cpu
+        self.user = user
+        self.system = system
+        self.wall = wall
+        self.peak_rss_kb = peak_rss_kb
+        self.stdout_bytes = stdout_bytes
+
+    def add_run(self, before: tuple, wall: float, stdout_bytes: int):
+        """Account a run that started when rusage() returned before"""
+        cpu, user, system, peak = rusage()
+        self.runs += 1
+        self.cpu += cpu - before[0]
+        self.user += user - before[1]
+        self.system += system - before[2]
+        self.wall += wall
+        self.peak_rss_kb = max(self.peak_rss_kb, peak)
+        self.stdout_bytes += stdout_bytes
+
+    def merge(self, other: "ResourceUsage"):
+        self.runs += other.runs
+        self.cpu += other.cpu
+        self.user += other.user
+        self.system += other.system
+        self.wall += other.wall
+        self.peak_rss_kb = max(self.peak_rss_kb, other.peak_rss_kb)
+        self.stdout_bytes += other.stdout_bytes
+
+    def describe(self) -> str:
+        return (f"CPU {format_ms(self.cpu)} (user {format_ms(self.user)}, "
+                f"system {format_ms(self.system)}), wall "
+                f"{format_ms(self.wall)}, peak RSS "
+                f"{self.peak_rss_kb / 1024:.1f} MiB, output "
+                f"{self.stdout_bytes} bytes over {self.runs} runs")
+
+    def to_dict(self) -> dict:
+        return {"runs": self.runs, "cpu": round(self.cpu, 6),
+                "user": round(self.user, 6),
+                "system": round(self.system, 6),
+                "wall": round(self.wall, 6),
+                "peak_rss_kb": self.peak_rss_kb,
+                "stdout_bytes": self.stdout_bytes}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ResourceUsage":
+        return cls(data["runs"], data["cpu"], data["user"], data["system"],
+                   data["wall"], data["peak_rss_kb"], data["stdout_bytes"])
+
+
+def total_usage(results: list[TestResult]) -> ResourceUsage:
+    """Resources of every student run behind some results"""
+    total = ResourceUsage()
+    for result in results:
+        if result.usage is not None:
+            total.merge(result.usage)
+    return total
+
+
+class ResultTally:
+    """Running pass/fail counts per check and per exercise
+
+    Results are counted as they stream in and then dropped. Failures are
+    written to a stream as NDJSON (spill) or forgotten, so a cohort-wide
+    run needs memory for its distinct checks only.
+    """
+
+    def __init__(self, spill=None):
+        self.checks = {}
+        self.exercises = {}
+        self.totals = {}
+        self.spill = spill
+
+    def add(self, kind: str, result: TestResult, student: str = ""):
+        passed = 1 if result.passed else 0
+        for counts, key in ((self.checks, (kind, result.exercise,
+                                           result.name)),
+                            (self.exercises, (kind, result.exercise)),
+                            (self.totals, kind)):
+            # [passed, total]
+            count = counts.get(key)
+            if count is None:
+                count = counts[key] = [0, 0]
+            count[0] += passed
+            count[1] += 1
+        if not passed and self.spill is not None:
+            self.spill.write(json.dumps({
+                "student": student, "kind": kind,
+                "exercise": result.exercise, "check": result.name,
+                "message": result.message}, ensure_ascii=False) + "\n")
+
+    def passed(self, kind: str):
+        """(passed, total) of every result of a kind"""
+        return tuple(self.totals.get(kind, (0, 0)))
+
+
+class Reporter:
+    """Receives every result as soon as it exists"""
+
+    # Writes to the process stdout, which the human output must then avoid
+    on_stdout = False
+
+    def start(self):
+        pass
+
+    def record(self, student: str, kind: str, result: TestResult):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class NDJSONReporter(Reporter):
+    """One JSON object per line and per result"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def record(self, student: str, kind: str, result: TestResult):
+        self.stream.write(json.dumps({
+            "student": student,
+            "exercise": result.exercise,
+            "kind": kind,
+            "check": result.name,
+            "passed": result.passed,
+            "message": result.message,
+            "duration": round(result.duration, 6),
+            **({"usage": result.usage.to_dict()}
+               if result.usage is not None else {}),
+        }, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+class JUnitReporter(Reporter):
+    """JUnit XML, written one testcase at a time"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def start(self):
+        self.stream.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                          '<testsuites name="growingcodetester">\n'
+                          '<testsuite name="growingcodetester">\n')
+        self.stream.flush()
+
+    def record(self, student: str, kind: str, result: TestResult):
+        from xml.sax.saxutils import escape, quoteattr
+
+        classname = ".".join(part for part in (student, result.exercise,
+                                               kind) if part)
+        self.stream.write(
+            f'<testcase classname={quoteattr(classname)} '
+            f'name={quoteattr(result.name)} '
+            f'time="{result.duration:.6f}"')
+        if result.passed:
+            self.stream.write('/>\n')
+        else:
+            self.stream.write(
+                f'><failure message={quoteattr(result.message)}>'
+                f'{escape(result.message)}</failure></testcase>\n')
+        self.stream.flush()
+
+    def finish(self):
+        self.stream.write('</testsuite>\n</testsuites>\n')
+        self.stream.flush()
+
+
+class ResultStore:
+    """Indexed SQLite history of every recorded result
+
+    Per-check pass counts and per-reason failure counts are kept up to
+    date in small totals tables while writing, so cohort-wide queries
+    never scan the results; student histories use a covering index.
+    Failures are counted by TestResult.reason (the 'message' column of
+    failure_totals), never by the formatted message: that one embeds
+    student output and would give almost every failure its own row.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY,
+            student TEXT NOT NULL,
+            exercise TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            check_name TEXT NOT NULL,
+            passed INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            run_started REAL NOT NULL,
+            recorded_at REAL NOT NULL,
+            duration REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_student
+            ON results (student, run_started, exercise, passed);
+        CREATE TABLE IF NOT EXISTS check_totals (
+            exercise TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            check_name TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            passed INTEGER NOT NULL,
+            PRIMARY KEY (exercise, kind, check_name)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS failure_totals (
+            exercise TEXT NOT NULL,
+            check_name TEXT NOT NULL,
+            message TEXT NOT NULL,
+            failures INTEGER NOT NULL,
+            PRIMARY KEY (exercise, check_name, message)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS failure_totals_count
+            ON failure_totals (failures);
+    """
+
+    def __init__(self, db_path: str):
+        import sqlite3
+
+        self.db = sqlite3.connect(db_path, timeout=60,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(self.SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add(self, rows: list[tuple]):
+        """Insert result rows in a single transaction
+
+        Rows are (student, exercise, kind, check, passed, message, digest,
+        run_started, recorded_at, duration, reason).
+        """
+        totals = collections.Counter()
+        passes = collections.Counter()
+        failures = collections.Counter()
+        for row in rows:
+            totals[row[1:4]] += 1
+            passes[row[1:4]] += row[4]
+            if not row[4]:
+                failures[row[1], row[3], row[10]] += 1
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "INSERT INTO results (student, exercise, kind, check_name, "
+                "passed, message, digest, run_started, recorded_at, "
+                "duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row[:10] for row in rows])
+            self.db.executemany(
+                "INSERT INTO check_totals VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT DO UPDATE SET "
+                "total = total + excluded.total, "
+                "passed = passed + excluded.passed",
+                [(*key, total, passes[key]) for key, total in totals.items()])
+            self.db.executemany(
+                "INSERT INTO failure_totals VALUES (?, ?, ?, ?) "
+                "ON CONFLICT DO UPDATE SET "
+                "failures = failures + excluded.failures",
+                [(*key, count) for key, count in failures.items()])
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def check_rates(self, exercise: str = None):
+        """(exercise, kind, check, total, passed) of every check"""
+        sql = "SELECT * FROM check_totals"
+        if exercise is not None:
+            return self.db.execute(f"{sql} WHERE exercise = ?", (exercise,))
+        return self.db.execute(sql)
+
+    def exercise_rates(self):
+        """(exercise, total, passed) of every exercise"""
+        return self.db.execute(
+            "SELECT exercise, SUM(total), SUM(passed) FROM check_totals "
+            "GROUP BY exercise")
+
+    def failures(self, exercise: str = None, limit: int = 20):
+        """Most frequent (exercise, check, reason, count) failures"""
+        where = ""
+        params = ()
+        if exercise is not None:
+            where = "WHERE exercise = ?"
+            params = (exercise,)
+        return self.db.execute(
+            f"SELECT * FROM failure_totals {where} "
+            "ORDER BY failures DESC LIMIT ?", (*params, limit))
+
+    def history(self, student: str):
+        """(run_started, exercise, total, passed) of every grading run"""
+        return self.db.execute(
+            "SELECT run_started, exercise, COUNT(*), SUM(passed) "
+            "FROM results WHERE student = ? "
+            "GROUP BY run_started, exercise ORDER BY run_started, exercise",
+            (student,))
+
+
+class SQLiteReporter(Reporter):
+    """Results appended to a ResultStore in batched transactions"""
+
+    def __init__(self, db_path: str, batch_size: int = 5000,
+                 flush_interval: float = 1.0):
+        self.store = ResultStore(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.last_flush = time.monotonic()
+        self.run_started = time.time()
+
+    def record(self, student: str, kind: str, result: TestResult):
+        self.rows.append((student, result.exercise, kind, result.name,
+                          int(result.passed), result.message, result.digest,
+                          self.run_started, time.time(), result.duration,
+                          result.reason))
+        if (len(self.rows) >= self.batch_size or
+                time.monotonic() - self.last_flush > self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.store.add(self.rows)
+            self.rows = []
+        self.last_flush = time.monotonic()
+
+    def finish(self):
+        self.flush()
+        self.store.close()
+
+
+REPORTERS = {"ndjson": NDJSONReporter, "junit": JUnitReporter,
+             "sqlite": SQLiteReporter}
+
+
+def make_reporter(spec: str) -> Reporter:
+    """Build a reporter from 'FORMAT' or 'FORMAT:PATH' ('-' is stdout)"""
+    report_format, _, path = spec.partition(":")
+    if report_format not in REPORTERS:
+        raise ValueError(f"Unknown report format '{report_format}' "
+                         f"(choose from {', '.join(REPORTERS)})")
+    if report_format == "sqlite":
+        if not path or path == "-":
+            raise ValueError("The sqlite report needs a database path")
+        return SQLiteReporter(path)
+    if not path or path == "-":
+        reporter = REPORTERS[report_format](sys.stdout)
+        reporter.on_stdout = True
+        return reporter
+    return REPORTERS[report_format](open(path, 'w', encoding='utf-8'))
+
+
+def default_cache_dir() -> str:
+    """Per-user cache folder, never inside the graded tree"""
+    base = (os.environ.get("XDG_CACHE_HOME") or
+            os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "growingcodetester")
+
+
+class ResultCache:
+    """Persistent content-addressed cache of TestResult lists
+
+    Entries are keyed by a hash of the graded file contents, the exercise
+    and the tester version, so an unchanged file is never re-checked.
+    The cache is bounded in bytes and evicts least recently used entries
+    (the modification time of an entry is refreshed on every hit).
+    """
+
+    def __init__(self, directory: str = None,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._size = None
+
+    def key(self, kind: str, exercise_name: str, directory: str,
+            digests: list[str]) -> str:
+        parts = [__version__, kind, exercise_name, directory, *digests]
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """Cached results for key, or None on a miss"""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r') as f:
+                data = json.load(f)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        return [TestResult.from_dict(item) for item in data]
+
+    def put(self, key: str, results: list[TestResult]):
+        """Store results under key, evicting old entries when full"""
+        entry_path = self._entry_path(key)
+        data = json.dumps([result.to_dict() for result in results])
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            temp_path = (f"{entry_path}.{os.getpid()}."
+                         f"{threading.get_ident()}.tmp")
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            # Atomic so concurrent batch workers never see partial entries
+            os.replace(temp_path, entry_path)
+        except OSError:
+            return
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict(int(self.max_bytes * 0.8))
+
+    def _entries(self):
+        """(path, size, last use) of every cache entry"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size,
+                                    stat.st_mtime))
+        return entries
+
+    def evict(self, target_bytes: int):
+        """Drop least recently used entries until under target_bytes"""
+        self._size = evict_lru(self._entries(), target_bytes)
+
+
+def evict_lru(entries: list[tuple], target_bytes: int) -> int:
+    """Delete the least recently used of (path, size, last use) entries
+    until they total target_bytes at most, return the size left"""
+    entries = sorted(entries, key=lambda entry: entry[2])
+    size = sum(entry_size for _, entry_size, _ in entries)
+    for entry_path, entry_size, _ in entries:
+        if size <= target_bytes:
+            break
+        try:
+            os.unlink(entry_path)
+            size -= entry_size
+        except OSError:
+            pass
+    return size
+
+
+_caches = {}
+
+
+def get_cache(directory: str = None) -> ResultCache:
+    """Return the result cache of this process for a cache folder"""
+    directory = directory or default_cache_dir()
+    if directory not in _caches:
+        _caches[directory] = ResultCache(directory)
+    return _caches[directory]
+
+
+class CodeCache:
+    """Compiled code objects of student files, keyed by source hash
+
+    Bounded in-memory LRU shared by every tester of the process, with an
+    optional on-disk copy (marshal files) in the user cache folder, never
+    in the graded tree, bounded in bytes like ResultCache. Keys include
+    the interpreter cache tag since marshalled code is version specific.
+    """
+
+    def __init__(self, directory: str = None, max_entries: int = 1024,
+                 max_bytes: int = 16 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._size = None
+        self._codes = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # Another thread may hold the lock when a sandbox forks
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def key(self, digest: str) -> str:
+        return f"{digest}.{sys.implementation.cache_tag}"
+
+    def get(self, digest: str):
+        """Code object compiled from a source with this digest, or None"""
+        key = self.key(digest)
+        with self._lock:
+            code = self._codes.get(key)
+            if code is not None:
+                self._codes.move_to_end(key)
+                return code
+        if self.directory is None:
+            return None
+        entry_path = os.path.join(self.directory, key)
+        try:
+            with open(entry_path, 'rb') as f:
+                code = marshal.load(f)
+            os.utime(entry_path)
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+        self._remember(key, code)
+        return code
+
+    def put(self, digest: str, code):
+        key = self.key(digest)
+        self._remember(key, code)
+        if self.directory is None:
+            return
+        entry_path = os.path.join(self.directory, key)
+        data = marshal.dumps(code)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = (f"{entry_path}.{os.getpid()}."
+                         f"{threading.get_ident()}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            return
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self._size = evict_lru(self._entries(),
+                                   int(self.max_bytes * 0.8))
+
+    def _entries(self):
+        """(path, size, last use) of every code file on disk"""
+        entries = []
+        try:
+            scan = list(os.scandir(self.directory))
+        except OSError:
+            return entries
+        for entry in scan:
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _remember(self, key: str, code):
+        with self._lock:
+            self._codes[key] = code
+            self._codes.move_to_end(key)
+            while len(self._codes) > self.max_entries:
+                self._codes.popitem(last=False)
+
+
+_code_caches = {}
+
+
+def get_code_cache(directory: str = None) -> CodeCache:
+    """Return the code cache of this process for a folder (or memory)"""
+    if directory not in _code_caches:
+        _code_caches[directory] = CodeCache(directory)
+    return _code_caches[directory]
+
+
+DEFAULT_SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "exercises.json")
+
+# Growth classes by power of n, as reported and accepted in specs
+COMPLEXITY_CLASSES = {"O(1)": 0, "O(n)": 1, "O(n^2)": 2, "O(n^3)": 3}
+
+# Bumped whenever the compiled registry layout changes
+SPEC_FORMAT = 5
+
+
+# Fields a step message template may use (see GrowingCodeTester.run_steps)
+STEP_FIELDS = ("args", "exception", "output", "outputs", "stripped")
+
+
+def check_template(template: str, where: str, runs: int):
+    """Reject a message template using fields the steps do not provide,
+    or the output of a run that has not happened yet"""
+    import string
+
+    try:
+        fields = [field for _, field, _, _ in
+                  string.Formatter().parse(template) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"{where}: bad message template {template!r}: {e}")
+    for field in fields:
+        name, _, rest = field.partition("[")
+        name = name.split(".")[0]
+        if name not in STEP_FIELDS:
+            raise ValueError(f"{where}: unknown field {{{field}}} in message "
+                             f"template (use {', '.join(STEP_FIELDS)})")
+        index = rest.split("]")[0]
+        if (name in ("outputs", "stripped") and index.isdigit() and
+                int(index) >= runs):
+            raise ValueError(f"{where}: {{{field}}} refers to run {index}, "
+                             f"only runs 0 to {runs - 1} precede this step")
+
+
+def compile_steps(steps: list, where: str) -> tuple:
+    """Test steps of a spec file entry as plain tuples
+
+    A step either calls the function ("call": arguments, optional
+    "inputs": scripted input lines, optional "error": message template)
+    or checks the outputs seen so far ("expect": matchers, "fail":
+    message template). A matcher needs every substring of "contains" or
+    one of "contains_any" in the output of run "run" (default: the
+    last one), optionally ignoring case.
+
+    A call with "stop_early" is stopped as soon as its output holds
+    every fragment the later matchers look for in it.
+    """
+    compiled = []
+    calls = []
+    watches = []
+    for step in steps:
+        if "call" in step:
+            inputs = step.get("inputs")
+            calls.append((len(compiled), bool(step.get("stop_early"))))
+            watches.append([])
+            error = step.get("error", "Exception: {exception}")
+            check_template(error, where, len(calls))
+            compiled.append((
+                "call",
+                None if inputs is None else tuple(str(i) for i in inputs),
+                tuple(step["call"]), error, None))
+        elif "expect" in step and "fail" in step:
+            matchers = []
+            for matcher in step["expect"]:
+                mode = "any" if "contains_any" in matcher else "all"
+                needles = matcher.get("contains_any",
+                                      matcher.get("contains"))
+                if not needles:
+                    raise ValueError(f"{where}: a matcher needs 'contains' "
+                                     f"or 'contains_any'")
+                run = matcher.get("run", -1)
+                if not -len(calls) <= run < len(calls):
+                    raise ValueError(f"{where}: no run {run} before this "
+                                     f"expect step")
+                lower = bool(matcher.get("ignore_case"))
+                needles = tuple(n.lower() if lower else n for n in needles)
+                matchers.append((run, mode, needles, lower))
+                watches[run].append((mode, needles, lower))
+            check_template(step["fail"], where, len(calls))
+            compiled.append(("expect", tuple(matchers), step["fail"]))
+        else:
+            raise ValueError(f"{where}: a step needs 'call' or "
+                             f"'expect' and 'fail'")
+    for (position, stop_early), watch in zip(calls, watches):
+        if stop_early and watch:
+            compiled[position] = compiled[position][:4] + (tuple(watch),)
+    return tuple(compiled)
+
+
+def compile_perf(perf: dict, where: str):
+    """Performance stage of a spec file entry, None when it has none
+
+    "inputs" and "call" may hold "{n}": it is replaced by each of the
+    growing "sizes" (in call arguments, by the integer itself). The
+    function fails over "budget_ms" at any size or when its growth is
+    worse than "max_class" (one of COMPLEXITY_CLASSES).
+    """
+    if perf is None:
+        return None
+    sizes = tuple(sorted(int(size) for size in perf["sizes"]))
+    if len(sizes) < 2 or sizes[0] < 1:
+        raise ValueError(f"{where}: perf needs two or more positive sizes")
+    max_class = perf.get("max_class")
+    if max_class is not None and max_class not in COMPLEXITY_CLASSES:
+        raise ValueError(f"{where}: unknown complexity class {max_class}, "
+                         f"expected one of {', '.join(COMPLEXITY_CLASSES)}")
+    inputs = perf.get("inputs")
+    return (None if inputs is None else tuple(str(i) for i in inputs),
+            tuple(perf.get("call", ())), sizes,
+            perf.get("budget_ms", 1000) / 1000, max_class)
+
+
+def output_matches(outputs: list[str], matcher: tuple) -> bool:
+    """Whether the output of a run holds the substrings of a matcher"""
+    run, mode, needles, lower = matcher
+    output = outputs[run].lower() if lower else outputs[run]
+    found = all if mode == "all" else any
+    return found(needle in output for needle in needles)
+
+
+def compile_spec(spec: dict, where: str):
+    """Index and per-exercise test blobs of a parsed spec file"""
+    index = {"title": spec.get("title", ""), "exercises": {}, "files": {},
+             "structure": {}, "authorized": {}, "validation": set(),
+             "digests": {}}
+    blobs = {}
+    try:
+        for exercise in sorted(spec["exercises"],
+                               key=lambda exercise: exercise["number"]):
+            num = int(exercise["number"])
+            if num in index["exercises"]:
+                raise ValueError(f"{where}: exercise {num} is defined "
+                                 f"twice")
+            directory = exercise["directory"]
+            files = exercise["files"]
+            name = exercise.get("name", files[0]["name"])
+            index["exercises"][num] = (name, directory)
+            index["files"][num] = [(entry["name"], directory)
+                                   for entry in files]
+            tests = []
+            for entry in files:
+                file_name = entry["name"]
+                index["structure"][file_name] = directory
+                # Cached verdicts of a file are only valid for its spec
+                index["digests"][file_name] = hashlib.sha256(json.dumps(
+                    [directory, entry], sort_keys=True).encode()
+                ).hexdigest()
+                if "authorized" in entry:
+                    index["authorized"][file_name] = frozenset(
+                        entry["authorized"])
+                if entry.get("validation"):
+                    index["validation"].add(file_name)
+                tests.append((file_name, directory, compile_steps(
+                    entry.get("steps", []), f"{where}: {file_name}"),
+                    entry.get("pass", "✓ Correct output"),
+                    compile_perf(entry.get("perf"), f"{where}: {file_name}")))
+            blobs[num] = marshal.dumps(tuple(tests))
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"{where}: malformed exercise spec ({e!r})")
+    index["validation"] = frozenset(index["validation"])
+    return index, blobs
+
+
+class ExerciseRegistry:
+    """Exercises of a curriculum, compiled from a JSON spec file
+
+    The spec is compiled once into a small index (exercise number to
+    name, directory and files, file name to directory and authorized
+    calls) and one marshal blob of test steps per exercise. Both are
+    cached on disk, keyed by the spec path, size and modification time,
+    so later runs never parse the spec again and only read the steps of
+    the exercises they grade.
+    """
+
+    def __init__(self, index: dict, blobs: dict = None,
+                 tests_path: str = None):
+        self.title = index["title"]
+        self.exercises = index["exercises"]
+        self.files = index["files"]
+        self.expected_structure = index["structure"]
+        self.authorized_functions = index["authorized"]
+        self.validation = index["validation"]
+        self.spec_digests = index["digests"]
+        self.offsets = index.get("offsets", {})
+        self._blobs = blobs
+        self._tests_path = tests_path
+        self._tests = {}
+
+    @classmethod
+    def load(cls, spec_path: str, cache_dir: str = None):
+        """Registry of a spec file, from the compiled cache when fresh"""
+        try:
+            stat = os.stat(spec_path)
+        except OSError as e:
+            raise ValueError(f"Cannot read exercise spec: {e}")
+        key = hashlib.sha256("\0".join([
+            str(SPEC_FORMAT), __version__, os.path.abspath(spec_path),
+            str(stat.st_mtime_ns), str(stat.st_size)]).encode()).hexdigest()
+        base = os.path.join(cache_dir or default_cache_dir(), "specs", key)
+        try:
+            with open(f"{base}.index", 'rb') as f:
+                return cls(marshal.load(f), tests_path=f"{base}.tests")
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+
+        try:
+            with open(spec_path, 'r', encoding='utf-8') as f:
+                spec = json.load(f)
+        except OSError as e:
+            raise ValueError(f"Cannot read exercise spec: {e}")
+        except ValueError as e:
+            raise ValueError(f"{spec_path}: invalid JSON ({e})")
+        index, blobs = compile_spec(spec, spec_path)
+        cls.save(base, index, blobs)
+        return cls(index, blobs=blobs)
+
+    @staticmethod
+    def save(base: str, index: dict, blobs: dict):
+        """Write the test blobs, then the index pointing into them"""
+        offsets = {}
+        position = 0
+        for num, blob in blobs.items():
+            offsets[num] = (position, len(blob))
+            position += len(blob)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            with open(f"{base}.tests.{suffix}", 'wb') as f:
+                f.write(b"".join(blobs.values()))
+            os.replace(f"{base}.tests.{suffix}", f"{base}.tests")
+            # The index goes last: once it exists the blobs are complete
+            with open(f"{base}.index.{suffix}", 'wb') as f:
+                marshal.dump(dict(index, offsets=offsets), f)
+            os.replace(f"{base}.index.{suffix}", f"{base}.index")
+        except OSError:
+            pass
+
+    def tests(self, exercise_num: int) -> tuple:
+        """(file, directory, steps, pass message, perf) of an exercise"""
+        tests = self._tests.get(exercise_num)
+        if tests is None:
+            if self._blobs is not None:
+                blob = self._blobs[exercise_num]
+            else:
+                offset, size = self.offsets[exercise_num]
+                with open(self._tests_path, 'rb') as f:
+                    f.seek(offset)
+                    blob = f.read(size)
+            tests = self._tests[exercise_num] = marshal.loads(blob)
+        return tests
+
+    def bounds(self) -> str:
+        numbers = list(self.exercises)
+        return f"{numbers[0]}-{numbers[-1]}" if numbers else "none"
+
+
+_registries = {}
+
+
+def get_registry(spec_path: str = None,
+                 cache_dir: str = None) -> ExerciseRegistry:
+    """Return the exercise registry of this process for a spec file"""
+    spec_path = os.path.abspath(spec_path or DEFAULT_SPEC)
+    if spec_path not in _registries:
+        _registries[spec_path] = ExerciseRegistry.load(spec_path, cache_dir)
+    return _registries[spec_path]
+
+
+LINT_BACKENDS = ("auto", "api", "subprocess")
+
+
+class Flake8Linter:
+    """Run flake8 over many files at once, in-process when possible
+
+    The 'api' backend drives flake8 through its Python API, the
+    'subprocess' backend runs a single flake8 command over all the
+    files. 'auto' tries the API first and falls back to the command.
+    """
+
+    def __init__(self, backend: str = "auto"):
+        if backend not in LINT_BACKENDS:
+            raise ValueError(f"Unknown lint backend: {backend}")
+        self.backend = backend
+        self._style_guide = None
+        self._violations = []
+        self._lock = threading.Lock()
+
+    def lint(self, paths: list[str], sources: dict = None):
+        """Return {path: [(line, code), ...]} for every given file
+
+        sources maps normalized paths to the content of files that only
+        exist in memory (archived submissions).
+        """
+        paths = [os.path.normpath(path) for path in paths]
+        if not paths:
+            return {}
+
+        # The style guide and its collected violations are shared
+        with self._lock:
+            return self._lint(paths, sources)
+
+    def _lint(self, paths: list[str], sources: dict = None):
+        if self.backend != "subprocess":
+            try:
+                if sources is not None:
+                    return self._lint_api_sources(paths, sources)
+                return self._lint_api(paths)
+            except ImportError:
+                if self.backend == "api":
+                    raise
+                # flake8 is not importable here, use the command instead
+                self.backend = "subprocess"
+        if sources is not None:
+            return self._lint_stdin(paths, sources)
+        return self._lint_subprocess(paths)
+
+    def warm_up(self):
+        """Import flake8 and build the style guide ahead of time"""
+        if self.backend == "subprocess":
+            return
+        try:
+            self._get_style_guide()
+        except ImportError:
+            if self.backend == "api":
+                raise
+            self.backend = "subprocess"
+
+    def _get_style_guide(self):
+        if self._style_guide is None:
+            from flake8.api import legacy
+            from flake8.formatting.base import BaseFormatter
+            from flake8.main.options import JobsArgument
+
+            violations = self._violations
+
+            class CollectingFormatter(BaseFormatter):
+                def handle(self, error):
+                    violations.append(error)
+
+                def start(self):
+                    pass
+
+                def stop(self):
+                    pass
+
+            style_guide = legacy.get_style_guide(
+                max_line_length=79, jobs=JobsArgument("1"))
+            style_guide.init_report(reporter=CollectingFormatter)
+            self._style_guide = style_guide
+        return self._style_guide
+
+    def _lint_api(self, paths: list[str]):
+        style_guide = self._get_style_guide()
+        del self._violations[:]
+        style_guide.check_files(paths)
+
+        errors = {path: [] for path in paths}
+        for violation in self._violations:
+            filename = os.path.normpath(violation.filename)
+            errors.setdefault(filename, []).append(
+                (violation.line_number, violation.code))
+        del self._violations[:]
+        return errors
+
+    def _lint_api_sources(self, paths: list[str], sources: dict):
+        from flake8.checker import FileChecker
+        from flake8.processor import FileProcessor
+
+        class MemoryFileChecker(FileChecker):
+            def __init__(self, lines, **kwargs):
+                self.lines = lines
+                super().__init__(**kwargs)
+
+            def _make_processor(self):
+                return FileProcessor(self.filename, self.options,
+                                     lines=self.lines)
+
+        application = self._get_style_guide()._application
+        guide = application.guide
+        errors = {}
+        for path in paths:
+            checker = MemoryFileChecker(
+                sources[path].splitlines(keepends=True), filename=path,
+                plugins=application.plugins.checkers,
+                options=application.options)
+            _, results, _ = checker.run_checks()
+            results.sort(key=lambda result: result[1:3])
+            with guide.processing_file(path):
+                for code, line, column, text, physical_line in results:
+                    guide.handle_error(code, path, line, column, text,
+                                       physical_line)
+            errors[path] = [(violation.line_number, violation.code)
+                            for violation in self._violations]
+            del self._violations[:]
+        return errors
+
+    def _lint_stdin(self, paths: list[str], sources: dict):
+        import subprocess
+
+        errors = {}
+        for path in paths:
+            result = subprocess.run(
+                [*FLAKE8_COMMAND, f"--stdin-display-name={path}", "-"],
+                input=sources[path],
+                capture_output=True,
+                text=True
+            )
+            errors.update(parse_flake8_output(
+                result.stdout, result.stderr, result.returncode, [path]))
+        return errors
+
+    def _lint_subprocess(self, paths: list[str]):
+        import subprocess
+
+        result = subprocess.run(
+            [*FLAKE8_COMMAND, *paths],
+            capture_output=True,
+            text=True
+        )
+        return parse_flake8_output(result.stdout, result.stderr,
+                                   result.returncode, paths)
+
+
+FLAKE8_COMMAND = ('flake8', '--max-line-length=79')
+
+
+def parse_flake8_output(stdout: str, stderr: str, returncode: int,
+                        paths: list[str]):
+    """{path: [(line, code), ...]} from the output of a flake8 command"""
+    errors = {path: [] for path in paths}
+    # Output lines look like "path:line:col: CODE message"
+    for line in stdout.splitlines():
+        for path in paths:
+            if not line.startswith(path + ':'):
+                continue
+            parts = line[len(path) + 1:].split(':', 2)
+            if len(parts) == 3 and parts[2].strip():
+                error_code = parts[2].strip().split()[0]
+                errors[path].append((int(parts[0]), error_code))
+            break
+    if returncode != 0 and not any(errors.values()):
+        raise RuntimeError(stderr.strip() or
+                           f"flake8 exited with {returncode}")
+    return errors
+
+
+_linters = {}
+
+
+def get_linter(backend: str = "auto") -> Flake8Linter:
+    """Return the linter of this process, kept warm between submissions"""
+    if backend not in _linters:
+        _linters[backend] = Flake8Linter(backend)
+    return _linters[backend]
+
+
+class Profiler:
+    """Elapsed time samples per grading phase"""
+
+    enabled = True
 
-class GrowingCodeTester:
     def __init__(self):
-        self.exercises = {
-            0: ("ft_hello_garden", "ex0"),
-            1: ("ft_plot_area", "ex1"),
-            2: ("ft_harvest_total", "ex2"),
-            3: ("ft_plant_age", "ex3"),
-            4: ("ft_water_reminder", "ex4"),
-            5: ("ft_count_harvest", "ex5"),
-            6: ("ft_garden_summary", "ex6"),
-            7: ("ft_seed_inventory", "ex7")
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def merge(self, samples: dict):
+        """Add the samples collected by another process"""
+        for name, values in (samples or {}).items():
+            self.samples.setdefault(name, []).extend(values)
+
+    def summary(self) -> dict:
+        """{phase: {count, total_ms, mean_ms, median_ms, p95_ms}} of
+        every phase"""
+        summary = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            total = sum(ordered)
+            p95 = ordered[max(0, -(-len(ordered) * 95 // 100) - 1)]
+            summary[name] = {
+                "count": len(ordered),
+                "total_ms": total * 1000,
+                "mean_ms": total * 1000 / len(ordered),
+                "median_ms": ordered[len(ordered) // 2] * 1000,
+                "p95_ms": p95 * 1000,
+            }
+        return summary
+
+    def print_table(self):
+        """Print total, mean and p95 of every phase"""
+        print_profile_table(self.summary())
+
+
+def print_profile_table(summary: dict):
+    """Print a Profiler.summary() as a table, slowest phases first"""
+    print(f"\n{Colors.CYAN}{Colors.BOLD}PROFILE{Colors.END}")
+    print(f"{'phase':<40} {'count':>6} {'total ms':>10} "
+          f"{'mean ms':>9} {'p95 ms':>9}")
+    rows = sorted(summary.items(), key=lambda item: -item[1]["total_ms"])
+    for name, stats in rows:
+        print(f"{name:<40} {stats['count']:>6} "
+              f"{stats['total_ms']:>10.2f} {stats['mean_ms']:>9.3f} "
+              f"{stats['p95_ms']:>9.3f}")
+
+
+class NullProfiler:
+    """Profiler used when profiling is off: records nothing"""
+
+    enabled = False
+    samples = None
+    _null_phase = contextlib.nullcontext()
+
+    def phase(self, name: str):
+        return self._null_phase
+
+    def add(self, name: str, seconds: float):
+        pass
+
+    def merge(self, samples: dict):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class OutputLimitExceeded(BaseException):
+    """Student code printed more than the configured output limit
+
+    A BaseException, like OutputComplete, so that student code catching
+    Exception cannot swallow it; the runs turn it into a failure.
+    """
+
+
+class OutputComplete(BaseException):
+    """Every watched fragment was printed: the run can stop here
+
+    A BaseException so that student code catching Exception cannot
+    swallow it and keep running.
+    """
+
+
+class CaseTimeout(BaseException):
+    """A single run went past its deadline (see run_deadline)"""
+
+
+@contextlib.contextmanager
+def run_deadline(seconds: float):
+    """Raise CaseTimeout in the block once seconds of wall time elapsed
+
+    Relies on SIGALRM, so only the main thread of a process is bounded
+    (the sandbox workers); elsewhere the block runs without a deadline.
+    """
+    import signal
+
+    if (not seconds or not hasattr(signal, "setitimer") or
+            threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise CaseTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class BoundedStringIO(io.StringIO):
+    """StringIO refusing to grow past a maximum number of UTF-8 bytes
+
+    It can also watch for expected fragments as output arrives: each
+    watcher is a (mode, fragments, ignore case) matcher, "all" needing
+    every fragment and "any" one of them. With stop_early, the write
+    completing the last watcher raises OutputComplete.
+    """
+
+    def __init__(self, limit: int = None, watch: tuple = None,
+                 stop_early: bool = False):
+        super().__init__()
+        self.limit = limit
+        self.size = 0
+        self.truncated = False
+        self.stop_early = stop_early
+        # [mode, fragments still unseen, ignore case] per watcher
+        self._watchers = [[mode, set(fragments), lower]
+                          for mode, fragments, lower in watch or ()]
+        # Fragments may span writes: keep the end of the output around
+        self._overlap = max((len(fragment) for _, fragments, _ in
+                             watch or () for fragment in fragments),
+                            default=1) - 1
+        self._tail = ""
+
+    def write(self, text: str) -> int:
+        size = len(text) if text.isascii() else len(text.encode())
+        if self.limit is not None and self.size + size > self.limit:
+            remaining = self.limit - self.size
+            if remaining > 0:
+                super().write(text.encode()[:remaining].decode(
+                    errors="ignore"))
+            self.size = self.limit
+            self.truncated = True
+            lines = self.getvalue()[-200:].splitlines()
+            raise OutputLimitExceeded(
+                f"Output truncated at {self.limit} bytes (output limit)"
+                f"{f', last line: {lines[-1]!r}' if lines else ''}")
+        self.size += size
+        written = super().write(text)
+        if self._watchers:
+            self._scan(text)
+        return written
+
+    def _scan(self, text: str):
+        window = self._tail + text
+        lowered = None
+        for watcher in self._watchers:
+            mode, unseen, lower = watcher
+            if lower and lowered is None:
+                lowered = window.lower()
+            seen = {fragment for fragment in unseen
+                    if fragment in (lowered if lower else window)}
+            if mode == "any" and seen:
+                unseen.clear()
+            else:
+                unseen -= seen
+        self._tail = window[-self._overlap:] if self._overlap else ""
+        if self.stop_early and self.matched():
+            raise OutputComplete()
+
+    def matched(self) -> bool:
+        """Whether every watcher has seen its fragments"""
+        return all(not unseen for _, unseen, _ in self._watchers)
+
+
+class RunIO:
+    """stdout buffer and scripted stdin of a single student run"""
+
+    def __init__(self, output_limit: int = None, inputs: list[str] = None,
+                 echo: bool = True, watch: tuple = None,
+                 stop_early: bool = False):
+        self.stdout = BoundedStringIO(output_limit, watch, stop_early)
+        self.inputs = iter(inputs) if inputs is not None else None
+        self.echo = echo
+
+
+_current_run = contextvars.ContextVar("growingcodetester_run",
+                                      default=None)
+
+# Resources of the runs behind the result being computed, if accounted
+_current_usage = contextvars.ContextVar("growingcodetester_usage",
+                                        default=None)
+
+
+def run_print(*args, **kwargs):
+    """print() of student modules, writing to the current run's buffer"""
+    run = _current_run.get()
+    if run is None or kwargs.get("file") not in (None, sys.stdout):
+        return builtins.print(*args, **kwargs)
+    kwargs["file"] = run.stdout
+    return builtins.print(*args, **kwargs)
+
+
+def run_input(prompt: str = "") -> str:
+    """input() of student modules, reading the current run's inputs"""
+    run = _current_run.get()
+    if run is None or run.inputs is None:
+        return builtins.input(prompt)
+    try:
+        value = next(run.inputs)
+    except StopIteration:
+        raise EOFError("No more input available")
+    if run.echo:
+        run.stdout.write(f"{prompt}{value}\n")  # Show what was "typed"
+    return value
+
+
+class SandboxLimits:
+    """Limits applied to student code running in a sandbox worker"""
+
+    def __init__(self, timeout: float = 10.0, cpu_seconds: int = 10,
+                 memory_mb: int = 512, output_bytes: int = 1024 * 1024):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.output_bytes = output_bytes
+
+    def fingerprint(self) -> str:
+        """The limits as part of a cache key: they change verdicts"""
+        return (f"{self.timeout:g}/{self.cpu_seconds}/{self.memory_mb}/"
+                f"{self.output_bytes}")
+
+    def apply(self):
+        """Set the rlimits of the current (child) process"""
+        try:
+            import resource
+        except ImportError:
+            return
+        limits = [
+            (resource.RLIMIT_CPU, self.cpu_seconds),
+            (resource.RLIMIT_AS, self.memory_mb and
+             self.memory_mb * 1024 * 1024),
+            (resource.RLIMIT_FSIZE, self.output_bytes),
+        ]
+        for limit, value in limits:
+            if not value:
+                continue
+            _, hard = resource.getrlimit(limit)
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+            try:
+                resource.setrlimit(limit, (value, hard))
+            except (ValueError, OSError):
+                pass
+
+
+class SandboxError(Exception):
+    """Student code was killed or crashed in its sandbox worker
+
+    usage holds the wall time and CPU time of the lost worker, when the
+    platform reports them.
+    """
+
+    def __init__(self, message: str, usage: ResourceUsage = None):
+        super().__init__(message)
+        self.usage = usage
+
+
+class SandboxFailure(TestResult):
+    """Failed result of a killed or crashed sandbox worker
+
+    Timeouts and crashes may come from a loaded machine, so these
+    results are never stored in the result cache.
+    """
+
+    __slots__ = ()
+
+
+class PerfResult(TestResult):
+    """Result of a timing check
+
+    Budgets and growth classes depend on the load of the machine, so
+    like sandbox failures these results are never cached.
+    """
+
+    __slots__ = ()
+
+
+class ToolFailure(TestResult):
+    """Failed result of a grading tool that is missing or broken
+
+    The submission is not at fault: once the tool is fixed the check
+    must run again, so these results are never cached either.
+    """
+
+    __slots__ = ()
+
+
+# Results that depend on the grading machine rather than the submission
+UNCACHEABLE_RESULTS = (SandboxFailure, PerfResult, ToolFailure)
+
+
+def cacheable(results: list[TestResult]) -> bool:
+    """Whether a list of results may be stored in or replayed from the
+    result cache"""
+    return not any(isinstance(result, UNCACHEABLE_RESULTS)
+                   for result in results)
+
+
+def run_isolated(func, limits: SandboxLimits):
+    """Run func() in a forked worker process and return its result
+
+    The worker gets the rlimits of limits and is killed once
+    limits.timeout seconds have elapsed. Timeouts and crashes raise
+    SandboxError with the reason. Without os.fork (Windows) func simply
+    runs in-process.
+    """
+    if not hasattr(os, "fork"):
+        return func()
+    import select
+
+    pid, read_fd, start = fork_worker(func, limits)
+    chunks = []
+    timed_out = False
+    finished = False
+    deadline = time.monotonic() + limits.timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            ready, _, _ = select.select([read_fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                finished = True
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+        status, child = reap_worker(pid, kill=not finished)
+    return worker_outcome(status, child, chunks, timed_out, limits, start)
+
+
+async def run_isolated_async(func, limits: SandboxLimits):
+    """run_isolated for the event loop thread
+
+    The worker is forked from the loop thread and its pipe awaited, so
+    no other thread is running when the process forks.
+    """
+    import asyncio
+
+    if not hasattr(os, "fork"):
+        return func()
+    pid, read_fd, start = fork_worker(func, limits)
+    timed_out = False
+    finished = False
+    chunks = []
+    try:
+        chunks = await asyncio.wait_for(read_until_eof([read_fd])[0],
+                                        limits.timeout)
+        finished = True
+    except asyncio.TimeoutError:
+        timed_out = True
+    finally:
+        os.close(read_fd)
+        status, child = reap_worker(pid, kill=not finished)
+    return worker_outcome(status, child, chunks, timed_out, limits, start)
+
+
+def read_until_eof(fds: list[int]) -> list:
+    """One awaitable per pipe, resolving to its chunks once it closes
+
+    The pipes are read by the running event loop itself, never by
+    helper threads.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    awaitables = []
+    for fd in fds:
+        chunks = []
+        done = loop.create_future()
+
+        def on_readable(fd=fd, chunks=chunks, done=done):
+            chunk = os.read(fd, 65536)
+            if chunk:
+                chunks.append(chunk)
+                return
+            loop.remove_reader(fd)
+            if not done.done():
+                done.set_result(chunks)
+
+        def stop_reading(_, fd=fd):
+            loop.remove_reader(fd)
+
+        loop.add_reader(fd, on_readable)
+        done.add_done_callback(stop_reading)
+        awaitables.append(done)
+    return awaitables
+
+
+def fork_worker(func, limits: SandboxLimits):
+    """Fork a worker running func() under limits
+
+    Returns its pid, the read end of the pipe its pickled outcome comes
+    back through, and its start time.
+    """
+    import pickle
+
+    read_fd, write_fd = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        # Worker: run func under limits, send the pickled outcome back
+        status = 0
+        try:
+            os.close(read_fd)
+            limits.apply()
+            try:
+                payload = ("ok", func())
+            except BaseException as e:
+                payload = ("error", f"{type(e).__name__}: {e}")
+            data = pickle.dumps(payload)
+            with os.fdopen(write_fd, 'wb') as pipe:
+                pipe.write(data)
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    return pid, read_fd, start
+
+
+def reap_worker(pid: int, kill: bool):
+    """Exit status and rusage (None if unknown) of a finished worker"""
+    import signal
+
+    if kill:
+        os.kill(pid, signal.SIGKILL)
+    if hasattr(os, "wait4"):
+        _, status, child = os.wait4(pid, 0)
+        return status, child
+    _, status = os.waitpid(pid, 0)
+    return status, None
+
+
+def worker_outcome(status: int, child, chunks: list[bytes],
+                   timed_out: bool, limits: SandboxLimits, start: float):
+    """Result of a reaped worker, or SandboxError with what it cost"""
+    import pickle
+    import signal
+
+    # What the worker cost, reported if its own accounting is lost
+    usage = ResourceUsage(1, wall=time.perf_counter() - start)
+    if child is not None:
+        usage.user, usage.system = child.ru_utime, child.ru_stime
+        usage.cpu = child.ru_utime + child.ru_stime
+        usage.peak_rss_kb = (child.ru_maxrss // 1024
+                             if sys.platform == "darwin"
+                             else child.ru_maxrss)
+
+    if timed_out:
+        raise SandboxError(f"Timed out after {limits.timeout:g}s", usage)
+    if os.WIFSIGNALED(status):
+        signum = os.WTERMSIG(status)
+        if signum == getattr(signal, "SIGXCPU", None):
+            raise SandboxError(f"CPU time limit exceeded "
+                               f"({limits.cpu_seconds}s)", usage)
+        raise SandboxError(f"Crashed with signal "
+                           f"{signal.Signals(signum).name}", usage)
+    if not chunks:
+        raise SandboxError(f"Crashed with exit code "
+                           f"{os.WEXITSTATUS(status)}", usage)
+
+    outcome, value = pickle.loads(b"".join(chunks))
+    if outcome == "error":
+        raise SandboxError(f"Crashed: {value}", usage)
+    return value
+
+
+VALIDATION_OPERATORS = (ast.Lt, ast.Gt, ast.LtE, ast.GtE)
+VALIDATION_WORDS = ("negative", "invalid")
+
+
+class SourceAnalysis(ast.NodeVisitor):
+    """Everything the compliance checks need, from a single AST pass
+
+    Collects the called names (attribute calls such as .capitalize()
+    included), the defined functions and validation-style code: ordering
+    comparisons against 0, or an if statement next to identifiers
+    mentioning negative/invalid values. Comments and string contents
+    never count, neither as calls nor as validation.
+    """
+
+    def __init__(self, content: str, file_path: str = "<unknown>"):
+        self.content = content
+        self.tree = ast.parse(content, file_path)
+        self.calls = []
+        self.functions = []
+        self.compares_to_zero = False
+        self.has_if = False
+        self.mentions_invalid = False
+        self.visit(self.tree)
+
+    @property
+    def has_validation(self) -> bool:
+        return self.compares_to_zero or (self.has_if and
+                                         self.mentions_invalid)
+
+    def _note_word(self, word: str):
+        lowered = word.lower()
+        if any(w in lowered for w in VALIDATION_WORDS):
+            self.mentions_invalid = True
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Name):
+            name = node.func.id
+        elif isinstance(node.func, ast.Attribute):
+            name = node.func.attr
+        else:
+            name = None
+        if name is not None and name not in self.calls:
+            self.calls.append(name)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.functions.append(node.name)
+        self._note_word(node.name)
+        self.generic_visit(node)
+
+    def visit_Compare(self, node: ast.Compare):
+        operands = [node.left, *node.comparators]
+        for i, op in enumerate(node.ops):
+            if isinstance(op, VALIDATION_OPERATORS) and (
+                    _is_zero(operands[i]) or _is_zero(operands[i + 1])):
+                self.compares_to_zero = True
+        self.generic_visit(node)
+
+    def visit_If(self, node: ast.If):
+        self.has_if = True
+        self.generic_visit(node)
+
+    def visit_IfExp(self, node: ast.IfExp):
+        self.has_if = True
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        self._note_word(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        self._note_word(node.attr)
+        self.generic_visit(node)
+
+
+def _is_zero(node: ast.AST) -> bool:
+    return (isinstance(node, ast.Constant) and
+            type(node.value) in (int, float) and node.value == 0)
+
+
+def normalized_tokens(tree: ast.AST) -> list[str]:
+    """Node types of a tree in source order, names and literals erased
+
+    Only the shape of the code is kept: every identifier, attribute
+    name and constant value is dropped, so renaming variables or
+    rewording strings does not change the sequence.
+    """
+    tokens = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.expr_context):
+            continue
+        if not isinstance(node, ast.Module):
+            tokens.append(type(node).__name__)
+        stack.extend(reversed(list(ast.iter_child_nodes(node))))
+    return tokens
+
+
+def winnow(tokens: list[str], k: int = 5, window: int = 4) -> set:
+    """Winnowed fingerprints of the k-grams of a token sequence"""
+    hashes = []
+    for i in range(len(tokens) - k + 1):
+        digest = hashlib.blake2b("\0".join(tokens[i:i + k]).encode(),
+                                 digest_size=8).digest()
+        hashes.append(int.from_bytes(digest, "big", signed=True))
+    if len(hashes) <= window:
+        return set(hashes)
+    fingerprints = set()
+    for i in range(len(hashes) - window + 1):
+        fingerprints.add(min(hashes[i:i + window]))
+    return fingerprints
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2",
+                    ".tar.xz")
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def archive_stem(path: str) -> str:
+    """Name of an archive without its archive suffix"""
+    name = os.path.basename(path)
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+class SubmissionFiles:
+    """Read access to the files of a submission folder"""
+
+    in_memory = False
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    def read(self, path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def stamp(self, path: str):
+        """(mtime, size) of a file, OSError if it does not exist"""
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+
+class MemoryFiles(SubmissionFiles):
+    """Submission files held in memory, keyed by path relative to root"""
+
+    in_memory = True
+
+    def __init__(self, root: str, members: dict):
+        super().__init__(root)
+        self.members = {
+            os.path.normpath(os.path.join(root, name)): data
+            for name, data in members.items()
         }
+
+    def exists(self, path: str) -> bool:
+        return os.path.normpath(path) in self.members
+
+    def read(self, path: str) -> bytes:
+        try:
+            return self.members[os.path.normpath(path)]
+        except KeyError:
+            raise FileNotFoundError(f"No such file: {path}")
+
+    def stamp(self, path: str):
+        return 0, len(self.read(path))
+
+
+class ArchiveFiles(MemoryFiles):
+    """Python files of a zip or tar submission, read straight to memory
+
+    Nothing is extracted: files are addressed as ARCHIVE/ex0/name.py,
+    and a single top-level folder wrapping the exercises is skipped.
+    Oversized members are ignored rather than decompressed.
+    """
+
+    max_member_bytes = 1024 * 1024
+
+    def __init__(self, root: str):
+        self.root = root
+        members = self._read_members()
+        tops = {name.split("/", 1)[0] for name in members}
+        prefix = ""
+        if len(tops) == 1 and all("/" in name for name in members):
+            top = tops.pop()
+            if not (top.startswith("ex") and top[2:].isdigit()):
+                prefix = f"{top}/"
+        super().__init__(root, {name[len(prefix):]: data
+                                for name, data in members.items()})
+
+    def _read_members(self) -> dict:
+        import tarfile
+        import zipfile
+
+        members = {}
+        if zipfile.is_zipfile(self.root):
+            with zipfile.ZipFile(self.root) as archive:
+                for info in archive.infolist():
+                    if (not info.is_dir() and info.filename.endswith(".py")
+                            and info.file_size <= self.max_member_bytes):
+                        name = info.filename.removeprefix("./")
+                        members[name] = archive.read(info)
+            return members
+        with tarfile.open(self.root, "r:*") as archive:
+            # Members are streamed in order, compressed tars included
+            for member in archive:
+                if (member.isfile() and member.name.endswith(".py") and
+                        member.size <= self.max_member_bytes):
+                    name = member.name.removeprefix("./")
+                    members[name] = archive.extractfile(member).read()
+        return members
+
+
+def open_submission(root: str) -> SubmissionFiles:
+    """File access for a submission folder or archive"""
+    if is_archive(root):
+        return ArchiveFiles(root)
+    return SubmissionFiles(root)
+
+
+# Reference solution of every exercise file, the oracle of --fuzz
+REFERENCE_SOLUTIONS = {
+    "ft_hello_garden": '''\
+def ft_hello_garden():
+    print("Hello, Garden community!")
+''',
+    "ft_plot_area": '''\
+def ft_plot_area():
+    length = int(input("Enter length: "))
+    width = int(input("Enter width: "))
+    print("Plot area:", length * width)
+''',
+    "ft_harvest_total": '''\
+def ft_harvest_total():
+    day1 = int(input("Day 1 harvest: "))
+    day2 = int(input("Day 2 harvest: "))
+    day3 = int(input("Day 3 harvest: "))
+    print("Total harvest:", day1 + day2 + day3)
+''',
+    "ft_plant_age": '''\
+def ft_plant_age():
+    age = int(input("Enter plant age in days: "))
+    if age > 60:
+        print("Plant is ready to harvest!")
+    else:
+        print("Plant needs more time to grow.")
+''',
+    "ft_water_reminder": '''\
+def ft_water_reminder():
+    days = int(input("Days since last watering: "))
+    if days > 2:
+        print("Water the plants!")
+    else:
+        print("Plants are fine")
+''',
+    "ft_count_harvest_iterative": '''\
+def ft_count_harvest_iterative():
+    days = int(input("Days until harvest: "))
+    for day in range(1, days + 1):
+        print("Day", day)
+    print("Harvest time!")
+''',
+    "ft_count_harvest_recursive": '''\
+def ft_count_harvest_recursive(day=0, days=None):
+    if days is None:
+        days = int(input("Days until harvest: "))
+        day = 1
+    if day > days:
+        print("Harvest time!")
+        return
+    print("Day", day)
+    ft_count_harvest_recursive(day + 1, days)
+''',
+    "ft_garden_summary": '''\
+def ft_garden_summary():
+    name = input("Enter garden name: ")
+    plants = input("Enter number of plants: ")
+    print("Garden:", name)
+    print("Plants:", plants)
+    print("Status: Growing well!")
+''',
+    "ft_seed_inventory": '''\
+def ft_seed_inventory(seed_type: str, quantity: int, unit: str) -> None:
+    name = seed_type.capitalize()
+    if unit == "packets":
+        print(f"{name} seeds: {quantity} packets available")
+    elif unit == "grams":
+        print(f"{name} seeds: {quantity} grams total")
+    elif unit == "area":
+        print(f"{name} seeds: covers {quantity} square meters")
+    else:
+        print("Unknown unit type")
+''',
+}
+
+_references = {}
+
+
+def load_reference(name: str):
+    """Reference function of an exercise file, compiled once"""
+    if name not in _references:
+        module = types.ModuleType(f"reference_{name}")
+        module.print = run_print
+        module.input = run_input
+        exec(compile(REFERENCE_SOLUTIONS[name], f"<reference {name}>",
+                     "exec"), module.__dict__)
+        _references[name] = getattr(module, name)
+    return _references[name]
+
+
+FUZZ_WORDS = ("tomato", "carrot", "basil", "lettuce", "mint", "a",
+              "Community Garden", "rose garden", "x y", "ÉTÉ")
+
+
+def _fuzz_int(rng, limit: int = 10000) -> int:
+    return rng.choice((rng.randint(0, 100), rng.randint(0, limit)))
+
+
+def _fuzz_word(rng) -> str:
+    if rng.random() < 0.5:
+        return rng.choice(FUZZ_WORDS)
+    letters = "abcdefghijklmnopqrstuvwxyz "
+    return "".join(rng.choice(letters)
+                   for _ in range(rng.randint(1, 12))).strip() or "z"
+
+
+# Per exercise file: (boundary cases, random case generator). A case is
+# (typed inputs, call arguments).
+FUZZ_CASES = {
+    "ft_hello_garden": ([((), ())], None),
+    "ft_plot_area": (
+        [((str(a), str(b)), ()) for a, b in
+         ((0, 0), (0, 7), (1, 1), (1, 0), (5, 3), (3, 5), (10 ** 6, 2))],
+        lambda rng: ((str(_fuzz_int(rng)), str(_fuzz_int(rng))), ())),
+    "ft_harvest_total": (
+        [((str(a), str(b), str(c)), ()) for a, b, c in
+         ((0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (5, 8, 3))],
+        lambda rng: (tuple(str(_fuzz_int(rng)) for _ in range(3)), ())),
+    "ft_plant_age": (
+        [((str(age),), ()) for age in (0, 1, 59, 60, 61, 62, 1000)],
+        lambda rng: ((str(_fuzz_int(rng, 200)),), ())),
+    "ft_water_reminder": (
+        [((str(days),), ()) for days in (0, 1, 2, 3, 4, 100)],
+        lambda rng: ((str(_fuzz_int(rng, 30)),), ())),
+    "ft_count_harvest_iterative": (
+        [((str(days),), ()) for days in (0, 1, 2, 3, 10)],
+        lambda rng: ((str(rng.randint(0, 60)),), ())),
+    "ft_count_harvest_recursive": (
+        [((str(days),), ()) for days in (0, 1, 2, 3, 10)],
+        lambda rng: ((str(rng.randint(0, 60)),), ())),
+    "ft_garden_summary": (
+        [((name, plants), ()) for name, plants in
+         (("Community Garden", "25"), ("a", "0"), ("x y", "1"))],
+        lambda rng: ((_fuzz_word(rng), str(_fuzz_int(rng))), ())),
+    "ft_seed_inventory": (
+        [((), (seed, quantity, unit)) for seed, quantity, unit in
+         (("tomato", 15, "packets"), ("carrot", 8, "grams"),
+          ("lettuce", 12, "area"), ("basil", 5, "unknown"),
+          ("mint", 0, "packets"), ("rose", 1, "Grams"), ("a", 2, ""))],
+        lambda rng: ((), (_fuzz_word(rng), _fuzz_int(rng),
+                          rng.choice(("packets", "grams", "area",
+                                      _fuzz_word(rng)))))),
+}
+
+
+def _numbers(text: str) -> list[str]:
+    """Integers printed in a text, in order"""
+    return "".join(char if char.isdigit() else " " for char in text).split()
+
+
+def _branch(text: str, *branches):
+    """Index of the first branch with a fragment in text, else None"""
+    return next((i for i, fragments in enumerate(branches)
+                 if any(fragment in text for fragment in fragments)), None)
+
+
+# Per exercise file: what the fuzzer compares with the reference, from
+# the printed text and the case. Like the spec matchers, it looks at the
+# numbers and the key fragment of each branch, never at the wording.
+FUZZ_VIEWS = {
+    "ft_hello_garden": lambda text, case: "Hello, Garden community!" in text,
+    "ft_plot_area": lambda text, case: _numbers(text)[-1:],
+    "ft_harvest_total": lambda text, case: _numbers(text)[-1:],
+    "ft_plant_age": lambda text, case: _branch(
+        text.lower(), ("needs more time", "not ready"),
+        ("ready to harvest",)),
+    "ft_water_reminder": lambda text, case: _branch(
+        text, ("Plants are fine",), ("Water the plants",)),
+    "ft_count_harvest_iterative": lambda text, case: (
+        _numbers(text), "Harvest time" in text),
+    "ft_count_harvest_recursive": lambda text, case: (
+        _numbers(text), "Harvest time" in text),
+    "ft_garden_summary": lambda text, case: tuple(
+        fragment in text for fragment in (*case[0], "Growing well!")),
+    "ft_seed_inventory": lambda text, case: (_branch(
+        text, ("Unknown unit type",), ("packets available",),
+        ("grams total",), ("square meters",)), _numbers(text)),
+}
+
+
+def fuzz_cases(name: str, count: int, seed: int = 0):
+    """Boundary cases, then random ones, count cases at most"""
+    import random
+
+    boundaries, generate = FUZZ_CASES[name]
+    cases = list(boundaries[:count])
+    if generate is not None:
+        rng = random.Random(f"{seed}:{name}")
+        cases.extend(generate(rng) for _ in range(count - len(cases)))
+    return cases
+
+
+def shrink_candidates(value):
+    """Simpler versions of an input or argument value"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        number = value
+    elif isinstance(value, str) and value.lstrip("-").isdigit():
+        number = int(value)
+    else:
+        if isinstance(value, str) and len(value) > 1:
+            return [value[:len(value) // 2], value[1:], value[:-1]]
+        return []
+    candidates = [0, 1, number // 2, number - 1]
+    candidates = [c for c in dict.fromkeys(candidates)
+                  if 0 <= c < number]
+    return candidates if isinstance(value, int) else [
+        str(c) for c in candidates]
+
+
+def format_ms(seconds: float) -> str:
+    milliseconds = seconds * 1000
+    return (f"{milliseconds:.0f} ms" if milliseconds >= 100 else
+            f"{milliseconds:.3g} ms")
+
+
+def fit_growth(sizes: list[int], seconds: list[float]):
+    """Exponent k of the power law t = c * n^k through the timings
+
+    Taken between the two largest sizes: lower-order terms (the prints
+    of a quadratic loop, the call itself) flatten the curve at small
+    sizes. Returns k and the nearest complexity class.
+    """
+    (n1, t1), (n2, t2) = list(zip(sizes, seconds))[-2:]
+    k = (math.log(max(t2, 1e-9)) - math.log(max(t1, 1e-9))) / math.log(
+        n2 / n1)
+    order = min(max(int(k + 0.5), 0), 3)
+    growth = next(name for name, power in COMPLEXITY_CLASSES.items()
+                  if power == order)
+    return k, growth
+
+
+class _Elided:
+    """Stand-in for the output of a run in a failure reason"""
+
+    def __getitem__(self, key):
+        return self
+
+    def __format__(self, format_spec: str) -> str:
+        return "…"
+
+    def __repr__(self) -> str:
+        return "…"
+
+
+def failure_reason(template: str, fields: dict) -> str:
+    """Failure message of a spec step without what varies between runs
+
+    The exception becomes its type name and the printed output an
+    ellipsis, so that failures group by cause.
+    """
+    exception = fields.get("exception")
+    return template.format(**dict(
+        fields, exception=type(exception).__name__ if exception else "",
+        output=_Elided(), outputs=_Elided(), stripped=_Elided()))
+
+
+# Suffix of the result name of each stage: fixed tests, fuzzing, timing
+STAGE_SUFFIXES = ("", "_fuzz", "_perf")
+
+
+def by_stage(staged: list[tuple]) -> list[TestResult]:
+    """Results of (stage, result) pairs: the fixed tests of every file
+    first, then fuzzing, then timing"""
+    return [result for _, result in sorted(staged, key=lambda item: item[0])]
+
+
+class GrowingCodeTester:
+    def __init__(self, root: str = "", quiet: bool = False,
+                 lint_backend: str = "auto", use_cache: bool = True,
+                 code_cache: bool = True,
+                 cache_dir: str = None, sandbox: bool = True,
+                 limits: SandboxLimits = None, reporters: list = None,
+                 profile: bool = False, concurrency: int = 0,
+                 files: SubmissionFiles = None, fuzz: int = 0,
+                 spec: str = None, perf: bool = False):
+        self.root = root
+        self.student = archive_stem(os.path.abspath(root or "."))
+        self.files = files or open_submission(root)
+        self.quiet = quiet
+        self.reporters = reporters or []
+        self.profiler = Profiler() if profile else NULL_PROFILER
+        self.concurrency = concurrency
+        self.fuzz = fuzz
+        self.perf = perf
+        self.linter = get_linter(lint_backend)
+        self.lint_results = {}
+        # Cache hits seen while picking files to lint, reused by cached()
+        self.cache_hits = {}
+        self.cache = get_cache(cache_dir) if use_cache else None
+        self.code_cache = get_code_cache(
+            os.path.join(self.cache.directory, "code")
+            if use_cache and code_cache else None)
+        self.digests = {}
+        self.analyses = {}
+        self.sandbox = sandbox
+        self.limits = limits or SandboxLimits()
+        self.registry = get_registry(spec, cache_dir)
+        self.exercises = self.registry.exercises
+        self.expected_structure = self.registry.expected_structure
+        self.authorized_functions = self.registry.authorized_functions
         self.results = []
         self.compliance_results = []
 
@@ -60,53 +2182,179 @@ class GrowingCodeTester:
 
     def capture_output(self, func, *args, **kwargs):
         """Capture stdout and return it along with any exception"""
-        old_stdout = sys.stdout
-        sys.stdout = captured_output = io.StringIO()
+        return self.run_captured(None, func, args, kwargs)
+
+    def simulate_input(self, inputs: list[str], func, *args, **kwargs):
+        """Simulate user input for testing"""
+        return self.run_captured(inputs, func, args, kwargs)
+
+    def run_captured(self, inputs, func, args, kwargs, watch=None):
+        """Run func with its own stdout buffer and scripted stdin
+
+        The run is published through a context variable read by the
+        print/input injected into student modules, so concurrent runs
+        in other threads never see each other's output. With watch,
+        the run stops as soon as its output holds the watched fragments.
+        """
+        run = RunIO(self.limits.output_bytes, inputs, watch=watch,
+                    stop_early=watch is not None)
+        token = _current_run.set(run)
+        usage = _current_usage.get()
+        start = time.perf_counter()
+        before = rusage() if usage is not None else None
 
         try:
-            result = func(*args, **kwargs)
-            output = captured_output.getvalue()
+            with self.profiler.phase("run"):
+                result = func(*args, **kwargs)
+            output = run.stdout.getvalue()
             return output, None, result
-        except Exception as e:
-            output = captured_output.getvalue()
+        except OutputComplete:
+            return run.stdout.getvalue(), None, None
+        except (Exception, OutputLimitExceeded) as e:
+            output = run.stdout.getvalue()
             return output, e, None
         finally:
-            sys.stdout = old_stdout
+            if usage is not None:
+                usage.add_run(before, time.perf_counter() - start,
+                              run.stdout.size)
+            _current_run.reset(token)
 
-    def simulate_input(self, inputs: List[str], func, *args, **kwargs):
-        """Simulate user input for testing"""
-        input_iter = iter(inputs)
+    def exercise_path(self, exercise_name: str, directory: str) -> str:
+        """Path of an exercise file inside the graded submission"""
+        return os.path.join(self.root, directory, f"{exercise_name}.py")
 
-        def mock_input(prompt=""):
+    def exercise_files(self, exercise_num: int):
+        """(file name, directory) of every file graded for an exercise"""
+        return self.registry.files[exercise_num]
+
+    def file_digest(self, file_path: str) -> str:
+        """sha256 of a file's content ('missing' if it does not exist)"""
+        if file_path not in self.digests:
             try:
-                value = next(input_iter)
-                print(f"{prompt}{value}")  # Show what was "typed"
-                return value
-            except StopIteration:
-                raise EOFError("No more input available")
-
-        # Temporarily replace input function
-        if isinstance(__builtins__, dict):
-            original_input = __builtins__['input']
-            __builtins__['input'] = mock_input
-        else:
-            original_input = __builtins__.input
-            __builtins__.input = mock_input
+                digest = hashlib.sha256(
+                    self.files.read(file_path)).hexdigest()
+            except OSError:
+                digest = "missing"
+            self.digests[file_path] = digest
+        return self.digests[file_path]
 
+    def compliance_key(self, exercise_name: str, directory: str) -> str:
+        file_path = self.exercise_path(exercise_name, directory)
+        return self.cache.key("compliance", exercise_name, directory,
+                              [self.registry.spec_digests[exercise_name],
+                               self.file_digest(file_path)])
+
+    def exercise_digests(self, exercise_num: int) -> list[str]:
+        return [
+            self.file_digest(self.exercise_path(file_name, file_directory))
+            for file_name, file_directory in self.exercise_files(
+                exercise_num)
+        ]
+
+    def functional_key(self, exercise_num: int) -> str:
+        exercise_name, directory = self.exercises[exercise_num]
+        kind = "functional"
+        if self.fuzz:
+            kind += f"+fuzz{self.fuzz}"
+        if self.perf:
+            kind += "+perf"
+        kind += f"@{self.limits.fingerprint()}"
+        spec_digests = [self.registry.spec_digests[file_name]
+                        for file_name, _ in self.exercise_files(exercise_num)]
+        return self.cache.key(kind, exercise_name, directory,
+                              spec_digests + self.exercise_digests(
+                                  exercise_num))
+
+    def file_stamps(self, exercise_num: int):
+        """(mtime, size) of the files of an exercise, None if missing"""
+        stamps = []
+        for exercise_name, directory in self.exercise_files(exercise_num):
+            try:
+                stamps.append(self.files.stamp(
+                    self.exercise_path(exercise_name, directory)))
+            except OSError:
+                stamps.append(None)
+        return stamps
+
+    def forget(self, exercise_num: int):
+        """Drop what is memoized about the files of an exercise"""
+        for exercise_name, directory in self.exercise_files(exercise_num):
+            file_path = self.exercise_path(exercise_name, directory)
+            self.digests.pop(file_path, None)
+            self.analyses.pop(file_path, None)
+            self.lint_results.pop(os.path.normpath(file_path), None)
+
+    def lint_candidates(self, exercise_nums: list[int]) -> list[str]:
+        """Files of the exercises that still need a flake8 run"""
+        paths = []
+        for exercise_num in exercise_nums:
+            for exercise_name, directory in self.exercise_files(
+                    exercise_num):
+                file_path = self.exercise_path(exercise_name, directory)
+                if (not self.files.exists(file_path) or
+                        os.path.normpath(file_path) in self.lint_results):
+                    continue
+                # Files with a cached verdict never need linting
+                if self.cache is not None:
+                    key = self.compliance_key(exercise_name, directory)
+                    hit = self.cache.get(key)
+                    if hit and cacheable(hit):
+                        self.cache_hits[key] = hit
+                        continue
+                paths.append(file_path)
+        return paths
+
+    def prelint(self, exercise_nums: list[int]):
+        """Lint the files of several exercises with a single flake8 run"""
+        paths = self.lint_candidates(exercise_nums)
+        if not paths:
+            return
         try:
-            return self.capture_output(func, *args, **kwargs)
-        finally:
-            # Restore original input
-            if isinstance(__builtins__, dict):
-                __builtins__['input'] = original_input
-            else:
-                __builtins__.input = original_input
+            with self.profiler.phase("lint"):
+                self.lint_results.update(self.lint(paths))
+        except Exception:
+            # Errors are reported per file by check_compliance
+            pass
+
+    def flake8_errors(self, file_path: str):
+        """flake8 (line, code) errors of a file, linting it if needed"""
+        file_path = os.path.normpath(file_path)
+        if file_path not in self.lint_results:
+            with self.profiler.phase("lint"):
+                self.lint_results.update(self.lint([file_path]))
+        return self.lint_results[file_path]
+
+    def lint(self, paths: list[str]):
+        """Lint files, from memory when they come from an archive"""
+        sources = None
+        if self.files.in_memory:
+            sources = {os.path.normpath(path): self.files.read(path).decode()
+                       for path in paths}
+        return self.linter.lint(paths, sources)
+
+    def fingerprints(self, exercise_name: str, directory: str) -> set:
+        """Winnowed AST fingerprints of a file (empty if unparsable)"""
+        file_path = self.exercise_path(exercise_name, directory)
+        try:
+            tree = self.analyze(file_path).tree
+        except (OSError, SyntaxError, ValueError):
+            return set()
+        return winnow(normalized_tokens(tree))
+
+    def analyze(self, file_path: str) -> "SourceAnalysis":
+        """Parse and analyze a file once, shared by every check"""
+        if file_path not in self.analyses:
+            content = self.files.read(file_path).decode()
+            with self.profiler.phase("parse"):
+                self.analyses[file_path] = SourceAnalysis(content,
+                                                          file_path)
+        return self.analyses[file_path]
 
     def check_compliance(self, exercise_name: str, directory: str):
         """Check code compliance with project requirements"""
-        file_path = os.path.join(directory, f"{exercise_name}.py")
+        file_path = self.exercise_path(exercise_name, directory)
 
-        if not os.path.exists(file_path):
+        if not self.files.exists(file_path):
             error_result = TestResult(
                 f"{exercise_name}_compliance",
                 False,
@@ -117,210 +2365,28 @@ class GrowingCodeTester:
         compliance_tests = []
 
         # Check 0: File structure compliance
-        expected_structure = {
-            "ft_hello_garden": "ex0",
-            "ft_plot_area": "ex1",
-            "ft_harvest_total": "ex2",
-            "ft_plant_age": "ex3",
-            "ft_water_reminder": "ex4",
-            "ft_count_harvest_iterative": "ex5",
-            "ft_count_harvest_recursive": "ex5",
-            "ft_garden_summary": "ex6",
-            "ft_seed_inventory": "ex7"
-        }
+        if exercise_name in self.expected_structure:
+            compliance_tests.append(self.timed(
+                self.check_file_structure, exercise_name, directory))
 
-        if exercise_name in expected_structure:
-            expected_dir = expected_structure[exercise_name]
-            if directory == expected_dir:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_file_structure",
-                    True,
-                    "✓ Correct file structure"
-                ))
-            else:
-                error_msg = (
-                    f"❌ Should be in {expected_dir}/ directory, "
-                    f"found in {directory}/"
-                )
-                error_result = TestResult(
-                    f"{exercise_name}_file_structure",
-                    False,
-                    error_msg
-                )
-                compliance_tests.append(error_result)
-
-        try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-
-            # Check 1: Authorized functions only
-            authorized_functions = {
-                "ft_hello_garden": ["print"],
-                "ft_plot_area": ["input", "int", "print"],
-                "ft_harvest_total": ["input", "int", "print"],
-                "ft_plant_age": ["input", "int", "print"],
-                "ft_water_reminder": ["input", "int", "print"],
-                "ft_count_harvest_iterative": ["input", "int", "print",
-                                               "range"],
-                "ft_count_harvest_recursive": ["input", "int", "print",
-                                               "range"],
-                "ft_garden_summary": ["input", "print"],
-                "ft_seed_inventory": ["print", "capitalize"]
-            }
+        try:
+            analysis = self.analyze(file_path)
 
-            if exercise_name in authorized_functions:
-                allowed = authorized_functions[exercise_name]
-                # Simple check for unauthorized function calls
-                import re
-                # Find function calls (word followed by parentheses)
-                pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\s*\('
-                function_calls = re.findall(pattern, content)
-                # Filter out main function definition and built-in constructs
-                unauthorized = []
-                excluded_funcs = [
-                    'if', 'for', 'while', 'def', 'class',
-                    'try', 'except', 'with'
-                ]
-                for func in function_calls:
-                    not_allowed = func not in allowed
-                    not_main = func != exercise_name
-                    not_excluded = func not in excluded_funcs
-                    is_unauthorized = not_allowed and not_main and not_excluded
-                    if is_unauthorized and func not in unauthorized:
-                        unauthorized.append(func)
-
-                if not unauthorized:
-                    compliance_tests.append(TestResult(
-                        f"{exercise_name}_authorized_functions",
-                        True,
-                        "✓ Uses only authorized functions"
-                    ))
-                else:
-                    compliance_tests.append(TestResult(
-                        f"{exercise_name}_authorized_functions",
-                        False,
-                        f"❌ Unauthorized functions: {', '.join(unauthorized)}"
-                    ))
-
-            # Check 2: No input validation
-            has_validation = any([
-                "< 0" in content,
-                "> 0" in content,
-                "<= 0" in content,
-                ">= 0" in content,
-                ("if" in content and ("negative" in content.lower() or
-                                      "invalid" in content.lower()))
-            ])
-
-            if (has_validation and exercise_name != "ft_plant_age" and
-                    exercise_name != "ft_water_reminder"):
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_no_validation",
-                    False,
-                    "❌ Should not handle input validation unless explicitly "
-                    "mentioned"
-                ))
-            else:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_no_validation",
-                    True,
-                    "✓ No unnecessary input validation"
-                ))
-
-            # Check 3: Only requested function exists
-            import ast
-            tree = ast.parse(content)
-            functions = [node.name for node in ast.walk(tree)
-                         if isinstance(node, ast.FunctionDef)]
-
-            if len(functions) == 1 and functions[0] == exercise_name:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_single_function",
-                    True,
-                    "✓ Contains only the requested function"
-                ))
-            else:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_single_function",
-                    False,
-                    f"❌ Should contain only {exercise_name}(), "
-                    f"found: {functions}"
-                ))
-
-            # Check 4: Function name matches exactly
-            if exercise_name in functions:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_correct_name",
-                    True,
-                    "✓ Function name matches exactly"
-                ))
-            else:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_correct_name",
-                    False,
-                    f"❌ Function {exercise_name} not found"
-                ))
+            # Checks 1-4 all read the same single-pass analysis
+            if exercise_name in self.authorized_functions:
+                compliance_tests.append(self.timed(
+                    self.check_authorized_functions, exercise_name,
+                    analysis))
+            compliance_tests.append(self.timed(
+                self.check_no_validation, exercise_name, analysis))
+            compliance_tests.append(self.timed(
+                self.check_single_function, exercise_name, analysis))
+            compliance_tests.append(self.timed(
+                self.check_correct_name, exercise_name, analysis))
 
             # Check 5: Flake8 compliance using integrated flake8
-            try:
-                # Write content to temporary file for flake8 check
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.py',
-                                                 delete=False) as temp_file:
-                    temp_file.write(content)
-                    temp_file_path = temp_file.name
-
-                # Run flake8 on the temporary file
-                result = subprocess.run(
-                    ['flake8', '--max-line-length=79', temp_file_path],
-                    capture_output=True,
-                    text=True
-                )
-
-                # Clean up temporary file
-                os.unlink(temp_file_path)
-
-                if result.returncode == 0:
-                    compliance_tests.append(TestResult(
-                        f"{exercise_name}_flake8",
-                        True,
-                        "✓ Flake8 compliant"
-                    ))
-                else:
-                    # Parse flake8 output to get error messages
-                    errors = (result.stdout.strip().split('\n')
-                              if result.stdout.strip() else [])
-                    error_summary = []
-                    for error in errors[:3]:  # Show first 3 errors
-                        if ':' in error:
-                            parts = error.split(':')
-                            if len(parts) >= 4:
-                                line_num = parts[1]
-                                error_code = parts[3].strip().split()[0]
-                                error_summary.append(f"{error_code} "
-                                                     f"(line {line_num})")
-
-                    error_msg = '; '.join(error_summary)
-                    if len(errors) > 3:
-                        error_msg += '...'
-
-                    compliance_tests.append(TestResult(
-                        f"{exercise_name}_flake8",
-                        False,
-                        f"❌ Flake8 issues: {error_msg}"
-                    ))
-
-            except FileNotFoundError:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_flake8",
-                    False,
-                    "❌ Flake8 not installed (pip install flake8)"
-                ))
-            except Exception as e:
-                compliance_tests.append(TestResult(
-                    f"{exercise_name}_flake8",
-                    False,
-                    f"❌ Flake8 check failed: {str(e)}"
-                ))
+            compliance_tests.append(self.timed(
+                self.check_flake8, exercise_name, file_path))
 
         except Exception as e:
             compliance_tests.append(TestResult(
@@ -329,354 +2395,725 @@ class GrowingCodeTester:
                 f"Error checking compliance: {e}"
             ))
 
-        return compliance_tests
+        return compliance_tests
+
+    def timed(self, check, *args) -> TestResult:
+        """Run a check and record its elapsed time on the result"""
+        start = time.perf_counter()
+        result = check(*args)
+        result.duration = time.perf_counter() - start
+        if self.profiler.enabled:
+            kind, _, name = check.__name__.partition("_")
+            phase = "compliance" if kind == "check" else "functional"
+            self.profiler.add(f"{phase}/{name}", result.duration)
+        return result
+
+    def check_file_structure(self, exercise_name: str, directory: str):
+        """Check 0: the file lives in its exercise directory"""
+        expected_dir = self.expected_structure[exercise_name]
+        if directory == expected_dir:
+            return TestResult(
+                f"{exercise_name}_file_structure",
+                True,
+                "✓ Correct file structure"
+            )
+        error_msg = (
+            f"❌ Should be in {expected_dir}/ directory, "
+            f"found in {directory}/"
+        )
+        return TestResult(
+            f"{exercise_name}_file_structure",
+            False,
+            error_msg
+        )
+
+    def check_authorized_functions(self, exercise_name: str,
+                                   analysis: "SourceAnalysis"):
+        """Check 1: only authorized functions are called"""
+        allowed = self.authorized_functions[exercise_name]
+        # The exercise function may call itself (recursive versions)
+        unauthorized = [func for func in analysis.calls
+                        if func not in allowed and func != exercise_name]
+
+        if not unauthorized:
+            return TestResult(
+                f"{exercise_name}_authorized_functions",
+                True,
+                "✓ Uses only authorized functions"
+            )
+        return TestResult(
+            f"{exercise_name}_authorized_functions",
+            False,
+            f"❌ Unauthorized functions: {', '.join(unauthorized)}"
+        )
+
+    def check_no_validation(self, exercise_name: str,
+                            analysis: "SourceAnalysis"):
+        """Check 2: no input validation unless the subject asks for it"""
+        if (analysis.has_validation and
+                exercise_name not in self.registry.validation):
+            return TestResult(
+                f"{exercise_name}_no_validation",
+                False,
+                "❌ Should not handle input validation unless explicitly "
+                "mentioned"
+            )
+        return TestResult(
+            f"{exercise_name}_no_validation",
+            True,
+            "✓ No unnecessary input validation"
+        )
+
+    def check_single_function(self, exercise_name: str,
+                              analysis: "SourceAnalysis"):
+        """Check 3: only the requested function exists"""
+        functions = analysis.functions
+        if len(functions) == 1 and functions[0] == exercise_name:
+            return TestResult(
+                f"{exercise_name}_single_function",
+                True,
+                "✓ Contains only the requested function"
+            )
+        return TestResult(
+            f"{exercise_name}_single_function",
+            False,
+            f"❌ Should contain only {exercise_name}(), "
+            f"found: {functions}"
+        )
+
+    def check_correct_name(self, exercise_name: str,
+                           analysis: "SourceAnalysis"):
+        """Check 4: the function name matches exactly"""
+        if exercise_name in analysis.functions:
+            return TestResult(
+                f"{exercise_name}_correct_name",
+                True,
+                "✓ Function name matches exactly"
+            )
+        return TestResult(
+            f"{exercise_name}_correct_name",
+            False,
+            f"❌ Function {exercise_name} not found"
+        )
+
+    def check_flake8(self, exercise_name: str, file_path: str):
+        """Check 5: flake8 compliance"""
+        try:
+            errors = self.flake8_errors(file_path)
+        except FileNotFoundError:
+            return ToolFailure(
+                f"{exercise_name}_flake8",
+                False,
+                "❌ Flake8 not installed (pip install flake8)"
+            )
+        except Exception as e:
+            return ToolFailure(
+                f"{exercise_name}_flake8",
+                False,
+                f"❌ Flake8 check failed: {str(e)}"
+            )
+
+        if not errors:
+            return TestResult(
+                f"{exercise_name}_flake8",
+                True,
+                "✓ Flake8 compliant"
+            )
+
+        error_summary = [f"{code} (line {line_num})"
+                         for line_num, code in errors[:3]]
+        error_msg = '; '.join(error_summary)
+        if len(errors) > 3:
+            error_msg += '...'
+
+        codes = ", ".join(sorted({code for _, code in errors}))
+        return TestResult(
+            f"{exercise_name}_flake8",
+            False,
+            f"❌ Flake8 issues: {error_msg}",
+            reason=f"❌ Flake8 issues: {codes}"
+        )
+
+    def compile_file(self, file_path: str):
+        """Code object of a file, compiled at most once per content"""
+        digest = self.file_digest(file_path)
+        code = self.code_cache.get(digest)
+        if code is None:
+            # Reuse the tree parsed by check_compliance
+            analysis = self.analyze(file_path)
+            with self.profiler.phase("compile"):
+                code = compile(analysis.tree, file_path, "exec")
+            self.code_cache.put(digest, code)
+        return code
 
     def load_function(self, exercise_name: str, directory: str):
         """Load function from exercise file"""
-        file_path = os.path.join(directory, f"{exercise_name}.py")
+        file_path = self.exercise_path(exercise_name, directory)
 
-        if not os.path.exists(file_path):
+        if not self.files.exists(file_path):
             return None, f"File {file_path} not found"
 
         try:
-            spec = importlib.util.spec_from_file_location(exercise_name,
-                                                          file_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
+            code = self.compile_file(file_path)
+            with self.profiler.phase("load"):
+                module = types.ModuleType(exercise_name)
+                module.__file__ = file_path
+                # Per-run I/O instead of swapping process-wide sys.stdout
+                module.print = run_print
+                module.input = run_input
+                exec(code, module.__dict__)
 
             if hasattr(module, exercise_name):
                 return getattr(module, exercise_name), None
             else:
                 return None, f"Function {exercise_name} not found in " \
                              f"{file_path}"
-        except Exception as e:
+        except (Exception, OutputLimitExceeded) as e:
             return None, f"Error loading {file_path}: {str(e)}"
 
-    def test_ex0_hello_garden(self):
-        """Test Exercise 0: Hello Garden"""
-        func, error = self.load_function("ft_hello_garden", "ex0")
+    def run_steps(self, file_name: str, directory: str, steps: tuple,
+                  success: str) -> TestResult:
+        """Run the spec steps of a file, stopping at the first failure"""
+        func, error = self.load_function(file_name, directory)
         if error:
-            return TestResult("ft_hello_garden", False, error)
+            return TestResult(file_name, False, error)
 
-        output, exception, _ = self.capture_output(func)
+        outputs = []
+        fields = {"args": ()}
+        for step in steps:
+            if step[0] == "call":
+                _, inputs, args, template, watch = step
+                output, exception, _ = self.run_captured(
+                    None if inputs is None else list(inputs), func, args, {},
+                    watch)
+                outputs.append(output)
+                fields = {"args": args, "exception": exception,
+                          "output": output, "outputs": outputs,
+                          "stripped": [out.strip() for out in outputs]}
+                if exception:
+                    return TestResult(file_name, False,
+                                      template.format(**fields),
+                                      reason=failure_reason(template,
+                                                            fields))
+            else:
+                _, matchers, template = step
+                if not all(output_matches(outputs, matcher)
+                           for matcher in matchers):
+                    return TestResult(file_name, False,
+                                      template.format(**fields),
+                                      reason=failure_reason(template,
+                                                            fields))
+        return TestResult(file_name, True, success)
 
-        if exception:
-            return TestResult("ft_hello_garden", False,
-                              f"Exception: {exception}")
+    def fuzz_run(self, func, case, deadline: float = None):
+        """Printed lines and exception name of one fuzz case, raising
+        CaseTimeout past the deadline"""
+        inputs, args = case
+        run = RunIO(self.limits.output_bytes, list(inputs), echo=False)
+        token = _current_run.set(run)
+        usage = _current_usage.get()
+        start = time.perf_counter()
+        before = rusage() if usage is not None else None
+        try:
+            with run_deadline(deadline):
+                func(*args)
+            error = None
+        except (Exception, OutputLimitExceeded) as e:
+            error = type(e).__name__
+        finally:
+            if usage is not None:
+                usage.add_run(before, time.perf_counter() - start,
+                              run.stdout.size)
+            _current_run.reset(token)
+        return ([" ".join(line.split())
+                 for line in run.stdout.getvalue().splitlines()], error)
 
-        expected = "Hello, Garden community!"
-        if expected in output:
-            return TestResult("ft_hello_garden", True, "✓ Correct output")
-        else:
-            return TestResult("ft_hello_garden", False,
-                              f"Expected '{expected}', got '{output.strip()}'")
+    def fuzz_differs(self, view, func, reference, case,
+                     deadline: float = None) -> bool:
+        """Whether func and reference disagree on what view compares"""
+        got, got_error = self.fuzz_run(func, case, deadline)
+        expected, expected_error = self.fuzz_run(reference, case)
+        return (got_error != expected_error or
+                view("\n".join(got), case) !=
+                view("\n".join(expected), case))
 
-    def test_ex1_plot_area(self):
-        """Test Exercise 1: Plot Area"""
-        func, error = self.load_function("ft_plot_area", "ex1")
-        if error:
-            return TestResult("ft_plot_area", False, error)
+    def shrink(self, view, func, reference, case, deadline: float = None):
+        """Simplest variant of a failing case that still fails (without
+        going past the deadline)"""
+        inputs, args = case
+        values = [*inputs, *args]
 
-        # Test with inputs: length=5, width=3
-        inputs = ["5", "3"]
-        output, exception, _ = self.simulate_input(inputs, func)
+        def split(values):
+            return tuple(values[:len(inputs)]), tuple(values[len(inputs):])
 
-        if exception:
-            return TestResult("ft_plot_area", False,
-                              f"Exception: {exception}")
+        def fails(values):
+            try:
+                return self.fuzz_differs(view, func, reference,
+                                         split(values), deadline)
+            except CaseTimeout:
+                return False
 
-        # Check if calculation is correct (5*3=15)
-        if "15" in output:
-            return TestResult("ft_plot_area", True, "✓ Correct calculation")
-        else:
-            return TestResult("ft_plot_area", False,
-                              f"Expected area 15, got: {output}")
+        for _ in range(200):
+            for i, value in enumerate(values):
+                simpler = [values[:i] + [candidate] + values[i + 1:]
+                           for candidate in shrink_candidates(value)]
+                simpler = next((trial for trial in simpler if fails(trial)),
+                               None)
+                if simpler is not None:
+                    values = simpler
+                    break
+            else:
+                break
+        return split(values)
+
+    def fuzz_function(self, exercise_name: str, directory: str):
+        """Compare a function with its reference on generated cases
 
-    def test_ex2_harvest_total(self):
-        """Test Exercise 2: Harvest Total"""
-        func, error = self.load_function("ft_harvest_total", "ex2")
+        Only what FUZZ_VIEWS extracts from the printed text is compared.
+        The student module is loaded once and reused for every case, and
+        each case gets a quarter of the sandbox timeout so that a case
+        that hangs is reported rather than killing the worker.
+        """
+        name = f"{exercise_name}_fuzz"
+        func, error = self.load_function(exercise_name, directory)
         if error:
-            return TestResult("ft_harvest_total", False, error)
+            return TestResult(name, False, error)
+        reference = load_reference(exercise_name)
+        view = FUZZ_VIEWS[exercise_name]
+        deadline = self.limits.timeout / 4
 
-        # Test with inputs: 5, 8, 3 (total should be 16)
-        inputs = ["5", "8", "3"]
-        output, exception, _ = self.simulate_input(inputs, func)
+        def shown(case):
+            inputs, args = case
+            return (f"{exercise_name}{args!r}" if args else
+                    f"inputs {list(inputs)}")
 
-        if exception:
-            return TestResult("ft_harvest_total", False,
-                              f"Exception: {exception}")
+        cases = fuzz_cases(exercise_name, self.fuzz)
+        failing = []
+        for case in cases:
+            try:
+                if self.fuzz_differs(view, func, reference, case, deadline):
+                    failing.append(case)
+            except CaseTimeout:
+                return TestResult(
+                    name, False,
+                    f"❌ Timed out after {deadline:g}s on {shown(case)}",
+                    reason="❌ Timed out on a generated case")
+        if not failing:
+            plural = "s" if len(cases) > 1 else ""
+            return TestResult(name, True, f"✓ Matches the reference on "
+                                          f"{len(cases)} case{plural}")
 
-        # Check if total calculation is correct (5+8+3=16)
-        if "16" in output:
-            return TestResult("ft_harvest_total", True,
-                              "✓ Correct total calculation")
-        else:
-            return TestResult("ft_harvest_total", False,
-                              f"Expected total 16, got: {output}")
+        case = self.shrink(view, func, reference, failing[0], deadline)
+        expected, expected_error = self.fuzz_run(reference, case)
+        got, got_error = self.fuzz_run(func, case, deadline)
+        return TestResult(
+            name, False,
+            f"❌ Differs from the reference on {len(failing)}/{len(cases)} "
+            f"cases, e.g. {shown(case)}: expected {expected}"
+            f"{f' ({expected_error})' if expected_error else ''}, got {got}"
+            f"{f' ({got_error})' if got_error else ''}",
+            reason="❌ Differs from the reference")
 
-    def test_ex3_plant_age(self):
-        """Test Exercise 3: Plant Age Check"""
-        func, error = self.load_function("ft_plant_age", "ex3")
-        if error:
-            return TestResult("ft_plant_age", False, error)
-
-        # Test ready to harvest (>60 days)
-        inputs = ["75"]
-        output, exception, _ = self.simulate_input(inputs, func)
-
-        if exception:
-            return TestResult("ft_plant_age", False,
-                              f"Exception: {exception}")
-
-        if "ready to harvest" in output.lower():
-            # Test boundary case (exactly 60 days - should NOT be ready)
-            inputs = ["60"]
-            output_boundary, exception_boundary, _ = self.simulate_input(
-                inputs, func)
-
-            if exception_boundary:
-                return TestResult("ft_plant_age", False,
-                                  f"Exception on boundary test: "
-                                  f"{exception_boundary}")
-
-            # Test not ready (<= 60 days)
-            inputs = ["45"]
-            output2, exception2, _ = self.simulate_input(inputs, func)
-
-            if exception2:
-                return TestResult("ft_plant_age", False,
-                                  f"Exception on second test: {exception2}")
-
-            boundary_not_ready = ("needs more time" in
-                                  output_boundary.lower() or
-                                  "not ready" in output_boundary.lower())
-            young_not_ready = ("needs more time" in output2.lower() or
-                               "not ready" in output2.lower())
-
-            if boundary_not_ready and young_not_ready:
-                return TestResult("ft_plant_age", True,
-                                  "✓ Correct age checking logic (>60)")
-            else:
-                return TestResult("ft_plant_age", False,
-                                  f"Wrong logic: 60 days -> "
-                                  f"{output_boundary.strip()}, "
-                                  f"45 days -> {output2.strip()}")
-        else:
-            return TestResult("ft_plant_age", False,
-                              f"Wrong output for mature plant: {output}")
+    def perf_time(self, func, inputs, args):
+        """Fastest of repeated runs of func, or the exception it raised
+
+        Like timeit, runs repeat with the garbage collector off until
+        20 ms are spent (at most 20 runs); the minimum is the run least
+        disturbed by the rest of the machine.
+        """
+        best = None
+        spent = 0.0
+        for _ in range(20):
+            run = RunIO(self.limits.output_bytes,
+                        None if inputs is None else list(inputs), echo=False)
+            token = _current_run.set(run)
+            usage = _current_usage.get()
+            before = rusage() if usage is not None else None
+            collecting = gc.isenabled()
+            gc.disable()
+            start = time.perf_counter()
+            try:
+                func(*args)
+            except (Exception, OutputLimitExceeded) as e:
+                return None, type(e).__name__
+            finally:
+                elapsed = time.perf_counter() - start
+                if collecting:
+                    gc.enable()
+                if usage is not None:
+                    usage.add_run(before, elapsed, run.stdout.size)
+                _current_run.reset(token)
+            best = elapsed if best is None else min(best, elapsed)
+            spent += elapsed
+            if spent >= 0.02:
+                break
+        return best, None
 
-    def test_ex4_water_reminder(self):
-        """Test Exercise 4: Water Reminder"""
-        func, error = self.load_function("ft_water_reminder", "ex4")
+    def perf_function(self, exercise_name: str, directory: str,
+                      perf: tuple) -> TestResult:
+        """Time a function at growing sizes against its budget and class"""
+        name = f"{exercise_name}_perf"
+        func, error = self.load_function(exercise_name, directory)
         if error:
-            return TestResult("ft_water_reminder", False, error)
+            return PerfResult(name, False, error)
 
-        # Test needs watering (>2 days)
-        inputs = ["4"]
-        output, exception, _ = self.simulate_input(inputs, func)
+        inputs, call, sizes, budget, max_class = perf
+        timings = []
+        failure = reason = None
+        for i, n in enumerate(sizes):
+            if len(timings) >= 2:
+                # Do not run a size the growth so far says is too slow
+                k, _ = fit_growth(sizes[:i], timings)
+                predicted = timings[-1] * (n / sizes[i - 1]) ** k
+                if predicted > 2 * budget:
+                    failure = (f"n={n} would take about "
+                               f"{format_ms(predicted)}, over the "
+                               f"{format_ms(budget)} budget")
+                    reason = "over the budget"
+                    break
+            seconds, error = self.perf_time(
+                func,
+                None if inputs is None else [i.format(n=n) for i in inputs],
+                [n if arg == "{n}" else arg for arg in call])
+            if error:
+                failure = f"{error} at n={n}"
+                reason = error
+                break
+            timings.append(seconds)
+            # Larger sizes would only take longer
+            if seconds > budget:
+                failure = (f"n={n} took {format_ms(seconds)}, over the "
+                           f"{format_ms(budget)} budget")
+                reason = "over the budget"
+                break
 
-        if exception:
-            return TestResult("ft_water_reminder", False,
-                              f"Exception: {exception}")
+        details = [", ".join(f"{n}: {format_ms(seconds)}"
+                             for n, seconds in zip(sizes, timings))]
+        if len(timings) >= 2:
+            k, growth = fit_growth(sizes, timings)
+            details.insert(0, f"{growth} growth (n^{k:.2f})")
+            if (failure is None and max_class is not None and
+                    COMPLEXITY_CLASSES[growth] >
+                    COMPLEXITY_CLASSES[max_class]):
+                failure = reason = f"expected at most {max_class}"
+        details = "; ".join(detail for detail in details if detail)
+        if failure is not None:
+            return PerfResult(name, False, f"❌ {failure}; {details}"
+                              if details else f"❌ {failure}",
+                              reason=f"❌ {reason}")
+        return PerfResult(name, True, f"✓ {details} (budget "
+                                      f"{format_ms(budget)})")
 
-        if "Water the plants" in output:
-            # Test boundary case (exactly 2 days - should be fine)
-            inputs = ["2"]
-            output_boundary, exception_boundary, _ = self.simulate_input(
-                inputs, func)
+    def run_test(self, exercise_num: int):
+        """Run a specific test"""
+        self.print_exercise_header(exercise_num)
 
-            if exception_boundary:
-                return TestResult("ft_water_reminder", False,
-                                  f"Exception on boundary test: "
-                                  f"{exception_boundary}")
+        # Run compliance checks first, linting the exercise in one go
+        self.prelint([exercise_num])
+        self.collect_compliance(exercise_num)
 
-            # Test plants are fine (<=2 days)
-            inputs = ["1"]
-            output2, exception2, _ = self.simulate_input(inputs, func)
+        # Run functional tests
+        results = self.cached(
+            lambda: self.functional_key(exercise_num),
+            lambda: self.run_sandboxed(exercise_num))
+        self.record_functional(exercise_num, results)
 
-            if exception2:
-                return TestResult("ft_water_reminder", False,
-                                  f"Exception on second test: {exception2}")
+    def run_tests(self, exercise_nums: list[int]):
+        """Run several exercises, concurrently when asked to"""
+        if self.concurrency:
+            import asyncio  # Only paid for by --async runs
 
-            boundary_fine = "Plants are fine" in output_boundary
-            recent_fine = "Plants are fine" in output2
+            asyncio.run(self.run_tests_async(exercise_nums))
+            return
+        self.prelint(exercise_nums)
+        for exercise_num in exercise_nums:
+            self.run_test(exercise_num)
 
-            if boundary_fine and recent_fine:
-                return TestResult("ft_water_reminder", True,
-                                  "✓ Correct watering logic (>2)")
-            else:
-                return TestResult("ft_water_reminder", False,
-                                  f"Wrong logic: 2 days -> "
-                                  f"{output_boundary.strip()}, "
-                                  f"1 day -> {output2.strip()}")
-        else:
-            return TestResult("ft_water_reminder", False,
-                              f"Wrong output for old watering: {output}")
+    async def run_tests_async(self, exercise_nums: list[int]):
+        """Run exercises with linting and functional tests overlapped
 
-    def test_ex5_count_harvest(self):
-        """Test Exercise 5: Count to Harvest (both iterative and recursive)"""
-        results = []
+        Every flake8 run and every functional test starts at once, at
+        most self.concurrency of them at a time; results are then
+        collected in exercise order.
+        """
+        import asyncio
 
-        # Test iterative version
-        func_iter, error = self.load_function("ft_count_harvest_iterative",
-                                              "ex5")
-        if error:
-            results.append(TestResult("ft_count_harvest_iterative", False,
-                                      error))
-        else:
-            inputs = ["3"]
-            output, exception, _ = self.simulate_input(inputs, func_iter)
-
-            if exception:
-                results.append(TestResult("ft_count_harvest_iterative", False,
-                                          f"Exception: {exception}"))
-            elif ("Day 1" in output and "Day 2" in output and
-                  "Day 3" in output and "Harvest time" in output):
-                results.append(TestResult("ft_count_harvest_iterative", True,
-                                          "✓ Correct iterative counting"))
-            else:
-                results.append(TestResult("ft_count_harvest_iterative", False,
-                                          f"Wrong counting output: {output}"))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        functional = {
+            exercise_num: asyncio.ensure_future(
+                self.functional_async(exercise_num, semaphore))
+            for exercise_num in exercise_nums
+        }
+        await self.prelint_async(exercise_nums, semaphore)
 
-        # Test recursive version
-        func_rec, error = self.load_function("ft_count_harvest_recursive",
-                                             "ex5")
-        if error:
-            results.append(TestResult("ft_count_harvest_recursive", False,
-                                      error))
-        else:
-            inputs = ["3"]
-            output, exception, _ = self.simulate_input(inputs, func_rec)
-
-            if exception:
-                results.append(TestResult("ft_count_harvest_recursive", False,
-                                          f"Exception: {exception}"))
-            elif ("Day 1" in output and "Day 2" in output and
-                  "Day 3" in output and "Harvest time" in output):
-                results.append(TestResult("ft_count_harvest_recursive", True,
-                                          "✓ Correct recursive counting"))
+        for exercise_num in exercise_nums:
+            self.print_exercise_header(exercise_num)
+            self.collect_compliance(exercise_num)
+            self.record_functional(exercise_num,
+                                   await functional[exercise_num])
+
+    async def prelint_async(self, exercise_nums: list[int], semaphore):
+        """Lint exercise files while the functional tests run
+
+        Linting stays on the loop thread (flake8 in-process, or one
+        flake8 process whose pipes the loop reads) so that sandbox
+        workers are always forked from a single-threaded process.
+        """
+        import asyncio
+
+        paths = self.lint_candidates(exercise_nums)
+        if not paths:
+            return
+        # Let the functional tests fork their workers before an
+        # in-process lint blocks the loop
+        await asyncio.sleep(0)
+        try:
+            with self.profiler.phase("lint"):
+                if (self.linter.backend == "subprocess" and
+                        not self.files.in_memory):
+                    async with semaphore:
+                        outcome = await self.lint_files_async(paths)
+                else:
+                    outcome = self.lint(paths)
+        except Exception:
+            # Errors are reported per file by check_compliance
+            return
+        self.lint_results.update(outcome)
+
+    async def lint_files_async(self, paths: list[str]):
+        """flake8 errors of some files from one awaited subprocess"""
+        import asyncio
+        import subprocess
+
+        paths = [os.path.normpath(path) for path in paths]
+        process = subprocess.Popen([*FLAKE8_COMMAND, *paths],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.gather(*read_until_eof(
+                [process.stdout.fileno(), process.stderr.fileno()]))
+        finally:
+            process.stdout.close()
+            process.stderr.close()
+            process.wait()
+        return parse_flake8_output(b"".join(stdout).decode(),
+                                   b"".join(stderr).decode(),
+                                   process.returncode, paths)
+
+    async def functional_async(self, exercise_num: int, semaphore):
+        """Functional results of an exercise
+
+        Sandbox workers are forked from the loop thread and awaited;
+        without a sandbox the tests run in a worker thread.
+        """
+        import asyncio
+
+        key = None
+        if self.cache is not None:
+            key = self.functional_key(exercise_num)
+            results = self.cache.get(key)
+            if results is not None and cacheable(results):
+                return results
+        async with semaphore:
+            if self.sandbox:
+                staged = []
+                for test in self.registry.tests(exercise_num):
+                    staged.extend(await self.run_file_isolated_async(test))
+                results = by_stage(staged)
             else:
-                results.append(TestResult("ft_count_harvest_recursive", False,
-                                          f"Wrong counting output: {output}"))
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(
+                    None, self.run_sandboxed, exercise_num)
+        if key is not None:
+            self.store(key, results)
+        return results
+
+    def print_exercise_header(self, exercise_num: int):
+        if not self.quiet:
+            exercise_name, _ = self.exercises[exercise_num]
+            print(f"\n{Colors.BLUE}Testing Exercise {exercise_num}: "
+                  f"{exercise_name}{Colors.END}")
+            print("-" * 50)
+
+    def collect_compliance(self, exercise_num: int):
+        """Compliance results of every file of an exercise"""
+        _, directory = self.exercises[exercise_num]
+        for file_name, file_directory in self.exercise_files(exercise_num):
+            compliance = self.cached(
+                lambda: self.compliance_key(file_name, file_directory),
+                lambda: self.check_compliance(file_name, file_directory))
+            digest = self.file_digest(
+                self.exercise_path(file_name, file_directory))
+            self.report("compliance", directory, compliance, digest)
+            self.compliance_results.extend(compliance)
+
+    def record_functional(self, exercise_num: int,
+                          results: list[TestResult]):
+        _, directory = self.exercises[exercise_num]
+        digests = self.exercise_digests(exercise_num)
+        digest = (digests[0] if len(digests) == 1 else
+                  hashlib.sha256("\0".join(digests).encode()).hexdigest())
+        self.report("functional", directory, results, digest)
+        self.results.extend(results)
+
+    def report(self, kind: str, directory: str, results: list[TestResult],
+               digest: str = ""):
+        """Tag results with their exercise and stream them to reporters"""
+        for result in results:
+            result.exercise = directory
+            result.digest = digest
+            for reporter in self.reporters:
+                reporter.record(self.student, kind, result)
 
+    def cached(self, make_key, compute):
+        """Return cached results, computing and storing them on a miss"""
+        if self.cache is None:
+            return compute()
+        key = make_key()
+        results = self.cache_hits.pop(key, None) or self.cache.get(key)
+        if results is None or not cacheable(results):
+            results = compute()
+            self.store(key, results)
         return results
 
-    def test_ex6_garden_summary(self):
-        """Test Exercise 6: Garden Summary"""
-        func, error = self.load_function("ft_garden_summary", "ex6")
-        if error:
-            return TestResult("ft_garden_summary", False, error)
+    def store(self, key: str, results: list[TestResult]):
+        """Cache results unless a killed sandbox worker, timings or a
+        broken tool are among them"""
+        if cacheable(results):
+            self.cache.put(key, results)
 
-        inputs = ["Community Garden", "25"]
-        output, exception, _ = self.simulate_input(inputs, func)
+    def run_sandboxed(self, exercise_num: int) -> list[TestResult]:
+        """Run the functional tests of an exercise, each check of each file
+        in its own sandbox worker so one runaway check cannot fail the
+        others"""
+        run_file = (self.run_file_isolated if self.sandbox
+                    else self.run_file_tests)
+        staged = []
+        for test in self.registry.tests(exercise_num):
+            staged.extend(run_file(test))
+        return by_stage(staged)
 
-        if exception:
-            return TestResult("ft_garden_summary", False,
-                              f"Exception: {exception}")
+    def run_file_isolated(self, test: tuple) -> list[tuple]:
+        """run_file_tests with every check in its own sandbox worker"""
+        self.precompile(test)
+        staged = []
+        for stage, check in self.file_checks(test):
+            try:
+                with self.profiler.phase("sandbox"):
+                    result, samples = run_isolated(
+                        self.check_worker(check), self.limits)
+            except SandboxError as e:
+                staged.append(self.sandbox_failure(test, stage, e))
+                continue
+            self.profiler.merge(samples)
+            staged.append((stage, result))
+        return staged
 
-        checks = [
-            "Community Garden" in output,
-            "25" in output,
-            "Growing well!" in output
-        ]
+    async def run_file_isolated_async(self, test: tuple) -> list[tuple]:
+        """run_file_isolated, forking from the event loop thread"""
+        self.precompile(test)
+        staged = []
+        for stage, check in self.file_checks(test):
+            try:
+                with self.profiler.phase("sandbox"):
+                    result, samples = await run_isolated_async(
+                        self.check_worker(check), self.limits)
+            except SandboxError as e:
+                staged.append(self.sandbox_failure(test, stage, e))
+                continue
+            self.profiler.merge(samples)
+            staged.append((stage, result))
+        return staged
 
-        if all(checks):
-            return TestResult("ft_garden_summary", True,
-                              "✓ Correct summary format")
-        else:
-            return TestResult("ft_garden_summary", False,
-                              f"Missing required elements in output: "
-                              f"{output}")
+    def precompile(self, test: tuple):
+        """Compile a file before forking so the code object outlives the
+        sandbox workers"""
+        file_name, directory = test[:2]
+        try:
+            self.compile_file(self.exercise_path(file_name, directory))
+        except Exception:
+            pass  # Reported by load_function inside the worker
 
-    def test_ex7_seed_inventory(self):
-        """Test Exercise 7: Seed Inventory with Type Annotations"""
-        func, error = self.load_function("ft_seed_inventory", "ex7")
-        if error:
-            return TestResult("ft_seed_inventory", False, error)
+    def check_worker(self, check):
+        """Function returning the result of check and its profile from
+        a sandbox worker"""
+        def run_in_worker():
+            # The worker starts from a copy of our samples: reset them
+            if self.profiler.enabled:
+                self.profiler.samples = {}
+            result = check()
+            return result, self.profiler.samples
+        return run_in_worker
 
-        test_cases = [
-            (("tomato", 15, "packets"), "packets available"),
-            (("carrot", 8, "grams"), "grams total"),
-            (("lettuce", 12, "area"), "square meters"),
-            (("basil", 5, "unknown"), "Unknown unit type")
-        ]
+    @staticmethod
+    def sandbox_failure(test: tuple, stage: int,
+                        error: SandboxError) -> tuple:
+        """Staged failure of a check whose sandbox worker was lost"""
+        usage = error.usage
+        name = test[0] + STAGE_SUFFIXES[stage]
+        return (stage, SandboxFailure(name, False, f"❌ {error}",
+                                      duration=usage.wall if usage else 0.0,
+                                      usage=usage))
 
-        for args, expected in test_cases:
-            output, exception, _ = self.capture_output(func, *args)
+    def file_checks(self, test: tuple) -> list[tuple]:
+        """(stage, check) of the spec steps of a file, then of its
+        fuzzing and timing when enabled: each check returns one result"""
+        file_name, directory, steps, success, perf = test
 
-            if exception:
-                return TestResult("ft_seed_inventory", False,
-                                  f"Exception with {args}: {exception}")
+        def fixed():
+            start = time.perf_counter()
+            result = self.accounted(self.run_steps, file_name, directory,
+                                    steps, success)
+            result.duration = time.perf_counter() - start
+            self.profiler.add(f"functional/{file_name}", result.duration)
+            return result
 
-            if expected not in output:
-                return TestResult("ft_seed_inventory", False,
-                                  f"Expected '{expected}' for {args}, "
-                                  f"got: {output}")
+        def fuzz():
+            with self.profiler.phase(f"fuzz/{file_name}"):
+                return self.accounted(self.fuzz_function, file_name,
+                                      directory)
 
-        return TestResult("ft_seed_inventory", True,
-                          "✓ All unit types handled correctly")
+        def timing():
+            with self.profiler.phase(f"perf/{file_name}"):
+                return self.accounted(self.perf_function, file_name,
+                                      directory, perf)
 
-    def run_test(self, exercise_num: int):
-        """Run a specific test"""
-        exercise_name, directory = self.exercises[exercise_num]
+        checks = [(0, fixed)]
+        # A missing file is already reported by the fixed tests
+        if not self.files.exists(self.exercise_path(file_name, directory)):
+            return checks
+        if self.fuzz and file_name in REFERENCE_SOLUTIONS:
+            checks.append((1, fuzz))
+        if self.perf and perf is not None:
+            checks.append((2, timing))
+        return checks
 
-        print(f"\n{Colors.BLUE}Testing Exercise {exercise_num}: "
-              f"{exercise_name}{Colors.END}")
-        print("-" * 50)
-
-        # Run compliance checks first
-        if exercise_num == 5:  # Special case for ex5 with two functions
-            compliance_iter = self.check_compliance(
-                "ft_count_harvest_iterative", directory)
-            compliance_rec = self.check_compliance(
-                "ft_count_harvest_recursive", directory)
-            self.compliance_results.extend(compliance_iter + compliance_rec)
-        else:
-            compliance = self.check_compliance(exercise_name, directory)
-            self.compliance_results.extend(compliance)
+    def run_file_tests(self, test: tuple) -> list[tuple]:
+        """(stage, result) of every check of a file"""
+        return [(stage, check()) for stage, check in self.file_checks(test)]
 
-        # Run functional tests
-        if exercise_num == 0:
-            result = self.test_ex0_hello_garden()
-            self.results.append(result)
-        elif exercise_num == 1:
-            result = self.test_ex1_plot_area()
-            self.results.append(result)
-        elif exercise_num == 2:
-            result = self.test_ex2_harvest_total()
-            self.results.append(result)
-        elif exercise_num == 3:
-            result = self.test_ex3_plant_age()
-            self.results.append(result)
-        elif exercise_num == 4:
-            result = self.test_ex4_water_reminder()
-            self.results.append(result)
-        elif exercise_num == 5:
-            results = self.test_ex5_count_harvest()
-            self.results.extend(results)
-        elif exercise_num == 6:
-            result = self.test_ex6_garden_summary()
-            self.results.append(result)
-        elif exercise_num == 7:
-            result = self.test_ex7_seed_inventory()
-            self.results.append(result)
+    def accounted(self, check, *args) -> TestResult:
+        """Run a check, attaching the resources of its student runs"""
+        usage = ResourceUsage()
+        token = _current_usage.set(usage)
+        try:
+            result = check(*args)
+        finally:
+            _current_usage.reset(token)
+        if usage.runs:
+            result.usage = usage
+        return result
 
     def print_result(self, result: TestResult):
         """Print a single test result"""
-        status_color = Colors.GREEN if result.passed else Colors.RED
-        status_symbol = "✅" if result.passed else "❌"
+        status_symbol, status_color = STATUS_STYLES[result.passed]
 
         print(f"{status_symbol} {Colors.BOLD}{result.name}{Colors.END}: "
               f"{status_color}{result.message}{Colors.END}")
 
     def print_summary(self):
         """Print final test summary"""
-        passed = sum(1 for r in self.results if r.passed)
-        total = len(self.results)
-
-        compliance_passed = sum(1 for r in self.compliance_results
-                                if r.passed)
-        compliance_total = len(self.compliance_results)
+        tally = ResultTally()
 
         print(f"\n{Colors.CYAN}{Colors.BOLD}")
         print("=" * 60)
@@ -690,6 +3127,7 @@ class GrowingCodeTester:
                   f"{Colors.END}")
             for result in self.compliance_results:
                 self.print_result(result)
+                tally.add("compliance", result)
 
         # Print functional test results
         if self.results:
@@ -697,11 +3135,17 @@ class GrowingCodeTester:
                   f"{Colors.END}")
             for result in self.results:
                 self.print_result(result)
+                tally.add("functional", result)
 
+        compliance_passed, compliance_total = tally.passed("compliance")
+        passed, total = tally.passed("functional")
         print(f"\n{Colors.BOLD}Compliance: {compliance_passed}/"
               f"{compliance_total} checks passed{Colors.END}")
         print(f"{Colors.BOLD}Functional: {passed}/{total} tests passed"
               f"{Colors.END}")
+        usage = total_usage(self.results)
+        if usage.runs:
+            print(f"Resources: {usage.describe()}")
 
         if passed == total and compliance_passed == compliance_total:
             print(f"{Colors.GREEN}{Colors.BOLD}🎉 All tests and compliance "
@@ -714,37 +3158,1531 @@ class GrowingCodeTester:
                   f"{Colors.END}")
 
 
-def main():
-    tester = GrowingCodeTester()
+_worker_profile = None
+
+
+def grade_submission(root: str, exercise_nums: list[int],
+                     tester_options: dict, profile_dump: str = None):
+    """Grade one student submission (runs inside a batch worker)"""
+    global _worker_profile
+
+    if profile_dump and _worker_profile is None:
+        import cProfile
+        _worker_profile = cProfile.Profile()
+    if profile_dump:
+        _worker_profile.enable()
+
+    tester = GrowingCodeTester(root=root, quiet=True, **tester_options)
+    tester.run_tests(exercise_nums)
+
+    if profile_dump:
+        _worker_profile.disable()
+        # Cumulative per worker process, merge them with pstats.Stats
+        _worker_profile.dump_stats(f"{profile_dump}.{os.getpid()}")
+    return (tester.compliance_results, tester.results,
+            tester.profiler.samples)
+
+
+def find_submissions(submissions_dir: str) -> list[str]:
+    """List student submissions: one subfolder or archive per student"""
+    return sorted(
+        entry.path for entry in os.scandir(submissions_dir)
+        if not entry.name.startswith(".") and (
+            entry.is_dir() or is_archive(entry.path))
+    )
+
+
+def parse_exercise_list(value: str,
+                        registry: ExerciseRegistry = None) -> list[int]:
+    """Parse 'all' or a comma separated list of exercise numbers"""
+    registry = registry or get_registry()
+    if value == "all":
+        return list(registry.exercises)
+    exercise_nums = []
+    for part in value.split(","):
+        exercise_num = int(part)
+        if exercise_num not in registry.exercises:
+            raise ValueError(f"Unknown exercise number (expected "
+                             f"{registry.bounds()}): {exercise_num}")
+        exercise_nums.append(exercise_num)
+    return exercise_nums
+
+
+def print_student_line(student: str, compliance_results, results):
+    """Print the one-line verdict of a graded student"""
+    compliance_passed = sum(1 for r in compliance_results if r.passed)
+    passed = sum(1 for r in results if r.passed)
+    ok = (compliance_passed == len(compliance_results) and
+          passed == len(results))
+    status_symbol, status_color = STATUS_STYLES[ok]
+    print(f"{status_symbol} {Colors.BOLD}{student}{Colors.END}: "
+          f"{status_color}compliance {compliance_passed}/"
+          f"{len(compliance_results)}, functional {passed}/"
+          f"{len(results)}{Colors.END}", flush=True)
+    return ok
+
+
+def print_cohort_tally(tally: ResultTally):
+    """Pass rate of every exercise, then of every failing check"""
+    print(f"\n{Colors.BOLD}Pass rate per exercise:{Colors.END}")
+    for (kind, exercise), (passed, total) in sorted(
+            tally.exercises.items(), key=lambda item: item[0][::-1]):
+        color = Colors.GREEN if passed == total else Colors.RED
+        print(f"  {exercise:<4} {kind:<10} {color}{passed}/{total} "
+              f"({100 * passed / total:.0f}%){Colors.END}")
+    failing = sorted(((passed / total, kind, exercise, name)
+                      for (kind, exercise, name), (passed, total)
+                      in tally.checks.items() if passed < total))
+    if failing:
+        print(f"{Colors.BOLD}Most failed checks:{Colors.END}")
+        for rate, kind, exercise, name in failing[:10]:
+            print(f"  {Colors.RED}{rate:4.0%}{Colors.END} {exercise} "
+                  f"{kind} {name}")
+
+
+def run_batch(submissions_dir: str, exercise_nums: list[int],
+              jobs: int, tester_options: dict, executor: str = "process",
+              reporters: list[Reporter] = (), profile_dump: str = None,
+              failures=None):
+    """Grade every submission of a cohort over a pool of workers
+
+    Cohort statistics are tallied as students complete; failure messages
+    are only written to the failures stream, if any, never kept.
+    """
+    import heapq
+    from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                    as_completed)
+
+    if executor == "thread":
+        # Forking sandbox workers from many threads is unsafe
+        tester_options = dict(tester_options, sandbox=False)
+        pool_class = ThreadPoolExecutor
+    else:
+        pool_class = ProcessPoolExecutor
+
+    submissions = find_submissions(submissions_dir)
+    if not submissions:
+        print(f"{Colors.YELLOW}No submissions found in "
+              f"{submissions_dir}{Colors.END}")
+        return 0
+
+    print(f"{Colors.BLUE}Grading {len(submissions)} submissions with "
+          f"{jobs} {executor} workers{Colors.END}")
+    start = time.perf_counter()
+    fully_passed = 0
+    profiler = (Profiler() if tester_options.get("profile")
+                else NULL_PROFILER)
+    tally = ResultTally(spill=failures)
+    # The 10 submissions with the most CPU time, as a bounded min-heap
+    costliest = []
+
+    with pool_class(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(grade_submission, root, exercise_nums,
+                        tester_options, profile_dump): root
+            for root in submissions
+        }
+        # Stream each student as soon as its worker is done
+        for future in as_completed(futures):
+            # Drop finished futures so their results can be freed
+            student = archive_stem(futures.pop(future))
+            try:
+                compliance_results, results, samples = future.result()
+            except Exception as e:
+                print(f"❌ {Colors.BOLD}{student}{Colors.END}: "
+                      f"{Colors.RED}Grading crashed: {e}{Colors.END}",
+                      flush=True)
+                continue
+            for result in compliance_results:
+                tally.add("compliance", result, student)
+            for result in results:
+                tally.add("functional", result, student)
+            for reporter in reporters:
+                for result in compliance_results:
+                    reporter.record(student, "compliance", result)
+                for result in results:
+                    reporter.record(student, "functional", result)
+            profiler.merge(samples)
+            usage = total_usage(results)
+            if usage.runs:
+                entry = (usage.cpu, student, usage)
+                if len(costliest) < 10:
+                    heapq.heappush(costliest, entry)
+                else:
+                    heapq.heappushpop(costliest, entry)
+            if print_student_line(student, compliance_results, results):
+                fully_passed += 1
+
+    elapsed = time.perf_counter() - start
+    print_cohort_tally(tally)
+    print_costliest(sorted(costliest, reverse=True))
+    print(f"\n{Colors.BOLD}Cohort: {fully_passed}/{len(submissions)} "
+          f"submissions fully passed{Colors.END}")
+    print(f"{Colors.BOLD}Graded in {elapsed:.2f}s "
+          f"({len(submissions) / elapsed:.1f} submissions/s){Colors.END}")
+    if profiler.enabled:
+        profiler.print_table()
+    if profile_dump:
+        print(f"cProfile stats written to {profile_dump}.<worker pid>")
+    return fully_passed
+
+
+def print_costliest(costliest: list[tuple]):
+    """The submissions whose student code used the most CPU time"""
+    if not costliest:
+        return
+    print(f"\n{Colors.BOLD}Most expensive submissions:{Colors.END}")
+    for _, student, usage in costliest:
+        print(f"  {student}: {usage.describe()}")
+
+
+def add_tester_arguments(parser):
+    """Options shared by every command that builds a GrowingCodeTester"""
+    parser.add_argument("--lint-backend", choices=LINT_BACKENDS,
+                        default="auto",
+                        help="run flake8 in-process ('api'), as one "
+                             "command ('subprocess') or pick ('auto')")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-check every file, ignoring cached results")
+    parser.add_argument("--no-code-cache", action="store_true",
+                        help="keep compiled student code in memory only, "
+                             "not in the cache folder")
+    parser.add_argument("--cache-dir", default=None,
+                        help="result cache folder (default: "
+                             "~/.cache/growingcodetester)")
+    parser.add_argument("--report", action="append", default=[],
+                        metavar="FORMAT[:PATH]",
+                        help="stream every result as ndjson or junit to "
+                             "PATH (default: stdout); may be repeated")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="overlap linting with functional tests")
+    parser.add_argument("--max-concurrency", type=int,
+                        default=2 * (os.cpu_count() or 1),
+                        help="linters and tests running at once with "
+                             "--async (default: twice the CPUs)")
+    parser.add_argument("--spec", metavar="FILE", default=None,
+                        help="JSON exercise spec of the curriculum "
+                             "(default: exercises.json next to this "
+                             "script)")
+    parser.add_argument("--fuzz", type=int, nargs="?", const=1000,
+                        default=0, metavar="N",
+                        help="also compare every function with a "
+                             "reference on N generated inputs "
+                             "(default N: 1000)")
+    parser.add_argument("--perf", action="store_true",
+                        help="also time functions at growing input sizes "
+                             "against their budget and growth class")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every grading phase and print a table")
+    parser.add_argument("--profile-dump", metavar="FILE", default=None,
+                        help="also write cProfile stats to FILE")
+    parser.add_argument("--no-sandbox", action="store_true",
+                        help="run student code in the tester process")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="wall-clock seconds per exercise (default: 10)")
+    parser.add_argument("--cpu-limit", type=int, default=10,
+                        help="CPU seconds per exercise (default: 10)")
+    parser.add_argument("--memory-limit", type=int, default=512,
+                        help="address space in MB per exercise "
+                             "(default: 512, 0 for none)")
+    parser.add_argument("--output-limit", type=int, default=1024 * 1024,
+                        help="bytes of output per run (default: 1 MiB)")
+
+
+def tester_options(args) -> dict:
+    """GrowingCodeTester keyword arguments from parsed options"""
+    return {"lint_backend": args.lint_backend,
+            "use_cache": not args.no_cache,
+            "code_cache": not args.no_code_cache,
+            "cache_dir": args.cache_dir,
+            "sandbox": not args.no_sandbox,
+            "limits": SandboxLimits(args.timeout, args.cpu_limit,
+                                    args.memory_limit, args.output_limit),
+            "profile": args.profile,
+            "fuzz": max(0, args.fuzz),
+            "spec": args.spec,
+            "perf": args.perf,
+            "concurrency": (max(1, args.max_concurrency)
+                            if args.async_mode else 0)}
+
+
+def open_reporters(parser, args) -> list[Reporter]:
+    """Create and start the reporters asked for with --report"""
+    try:
+        reporters = [make_reporter(spec) for spec in args.report]
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    for reporter in reporters:
+        reporter.start()
+    # A report on stdout must stay parseable: print the rest to stderr
+    if any(reporter.on_stdout for reporter in reporters):
+        sys.stdout = sys.stderr
+    return reporters
+
+
+def close_reporters(reporters: list[Reporter]):
+    for reporter in reporters:
+        reporter.finish()
+        if reporter.on_stdout:
+            sys.stdout = reporter.stream
+        elif hasattr(reporter, "stream"):
+            reporter.stream.close()
+
+
+def batch_main(argv: list[str]):
+    """Entry point of the 'batch' command"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py batch",
+        description="Grade a folder of submissions, one subfolder per "
+                    "student"
+    )
+    parser.add_argument("submissions_dir",
+                        help="folder containing one subfolder per student")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=os.cpu_count() or 1,
+                        help="number of workers (default: CPUs)")
+    parser.add_argument("--executor", choices=("process", "thread"),
+                        default="process",
+                        help="grade in worker processes (default) or "
+                             "threads; threads run student code without "
+                             "the sandbox")
+    parser.add_argument("-e", "--exercises", default="all",
+                        help="'all' or comma separated exercise numbers")
+    parser.add_argument("--failures", metavar="FILE", default=None,
+                        help="write every failure message to FILE as "
+                             "NDJSON")
+    add_tester_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        exercise_nums = parse_exercise_list(
+            args.exercises, get_registry(args.spec, args.cache_dir))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if not os.path.isdir(args.submissions_dir):
+        parser.error(f"{args.submissions_dir} is not a directory")
+
+    failures = None
+    if args.failures:
+        try:
+            failures = open(args.failures, 'w', encoding='utf-8')
+        except OSError as e:
+            parser.error(str(e))
+    reporters = open_reporters(parser, args)
+    try:
+        run_batch(args.submissions_dir, exercise_nums, args.jobs,
+                  tester_options(args), args.executor, reporters,
+                  args.profile_dump, failures)
+    finally:
+        close_reporters(reporters)
+        if failures is not None:
+            failures.close()
+
+
+def default_socket_path() -> str:
+    return os.path.join(default_cache_dir(), "grader.sock")
+
+
+def grade_request(request: dict, options: dict) -> dict:
+    """Grade the submission described by a serve request"""
+    path = request.get("path")
+    if not isinstance(path, str) or not (os.path.isdir(path) or
+                                         is_archive(path)):
+        return {"error": f"Not a directory or archive: {path}"}
+    exercises = request.get("exercises", "all")
+    try:
+        if isinstance(exercises, list):
+            exercises = ",".join(str(num) for num in exercises)
+        exercise_nums = parse_exercise_list(str(exercises), get_registry(
+            options.get("spec"), options.get("cache_dir")))
+    except ValueError as e:
+        return {"error": str(e)}
+
+    start = time.perf_counter()
+    tester = GrowingCodeTester(root=path, quiet=True, **options)
+    tester.run_tests(exercise_nums)
+
+    def as_dicts(results):
+        return [dict(result.to_dict(), exercise=result.exercise)
+                for result in results]
+
+    return {
+        "student": tester.student,
+        "passed": all(result.passed for result in
+                      tester.compliance_results + tester.results),
+        "compliance": as_dicts(tester.compliance_results),
+        "functional": as_dicts(tester.results),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def warm_up_worker(options: dict):
+    """Load flake8 in a grading worker before its first request"""
+    get_linter(options.get("lint_backend", "auto")).warm_up()
+
+
+def grading_context():
+    """multiprocessing context of long-lived grading workers
+
+    Workers are started by a fork server when available, so the sandbox
+    workers they fork come from single-threaded processes.
+    """
+    import multiprocessing
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else None)
+    if "forkserver" in methods:
+        context.set_forkserver_preload(["__main__"])
+    return context
+
+
+def serve(socket_path: str, options: dict, jobs: int = None):
+    """Grade requests from local clients with warm testers
+
+    Every connection sends JSON lines such as
+    {"path": "/abs/student", "exercises": [0, 3]} and gets one JSON line
+    back per request. Clients are served concurrently, one thread each,
+    but the threads only move JSON: grading runs in a pool of worker
+    processes started by a fork server, so sandbox workers are always
+    forked from single-threaded processes. Each grading worker loads
+    flake8 once and keeps its caches warm across requests.
+    """
+    import signal
+    import socketserver
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    context = grading_context()
+    pools = []
+    pool_lock = threading.Lock()
+
+    def grade(request: dict) -> dict:
+        with pool_lock:
+            if not pools:
+                pools.append(ProcessPoolExecutor(
+                    max_workers=jobs or os.cpu_count() or 1,
+                    mp_context=context, initializer=warm_up_worker,
+                    initargs=(options,)))
+            pool = pools[0]
+        try:
+            return pool.submit(grade_request, request, options).result()
+        except BrokenProcessPool:
+            # A worker died (student code without sandbox): start afresh
+            with pool_lock:
+                if pools and pools[0] is pool:
+                    pools.pop()
+            raise
+
+    class GradeHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    response = grade(json.loads(line))
+                except ValueError as e:
+                    response = {"error": f"Invalid request: {e}"}
+                except Exception as e:
+                    response = {"error": f"Grading failed: {e}"}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+                if "error" in response:
+                    print(f"{Colors.RED}{response['error']}{Colors.END}",
+                          flush=True)
+                else:
+                    print(f"{response['student']}: "
+                          f"{'passed' if response['passed'] else 'failed'}"
+                          f" in {response['elapsed'] * 1000:.0f} ms",
+                          flush=True)
+
+    class GradeServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)),
+                exist_ok=True)
+    # Stop cleanly (and remove the socket) when asked to terminate
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with GradeServer(socket_path, GradeHandler) as server:
+        os.chmod(socket_path, 0o600)
+        # Start a worker and load flake8 now rather than on a request
+        grade({"path": None})
+        print(f"{Colors.GREEN}Serving on {socket_path} "
+              f"(Ctrl+C to stop){Colors.END}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+            for pool in pools:
+                pool.shutdown(cancel_futures=True)
+
+
+def request_grade(socket_path: str, path: str, exercises="all") -> dict:
+    """Send one grade request to a running 'serve' process"""
+    import socket
+
+    request = {"path": os.path.abspath(path), "exercises": exercises}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile('rb') as stream:
+            return json.loads(stream.readline())
+
+
+def serve_main(argv: list[str]):
+    """Entry point of the 'serve' command"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py serve",
+        description="Keep a warm tester behind a Unix-domain socket"
+    )
+    parser.add_argument("--socket", default=default_socket_path(),
+                        help="socket path (default: "
+                             "~/.cache/growingcodetester/grader.sock)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="grading worker processes (default: CPUs)")
+    add_tester_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    serve(args.socket, tester_options(args), args.jobs)
+
+
+def client_main(argv: list[str]):
+    """Entry point of the 'client' command"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py client",
+        description="Grade a submission through a running 'serve' process"
+    )
+    parser.add_argument("path", nargs="?", default=".",
+                        help="submission folder (default: current folder)")
+    parser.add_argument("-e", "--exercises", default="all",
+                        help="'all' or comma separated exercise numbers")
+    parser.add_argument("--socket", default=default_socket_path(),
+                        help="socket path of the server")
+    args = parser.parse_args(argv)
+
+    try:
+        response = request_grade(args.socket, args.path, args.exercises)
+    except OSError as e:
+        parser.error(f"Cannot reach server on {args.socket}: {e}")
+    print(json.dumps(response, indent=2, ensure_ascii=False))
+    if "error" in response or not response["passed"]:
+        sys.exit(1)
+
+
+class GradingQueue:
+    """Submission jobs in a SQLite file that workers on many hosts lease
+
+    A job is leased for a visibility timeout; a worker that crashes simply
+    stops renewing its lease and the job becomes available again. Results
+    are written back only by the current lease holder, once, so duplicate
+    or late workers never overwrite a finished job. The database must sit
+    on storage every worker reaches with working file locks.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            exercises TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            lease_token TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            result TEXT,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_state
+            ON jobs (state, lease_expires);
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 3):
+        import sqlite3
+
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(db_path, timeout=60,
+                                  isolation_level=None)
+        self.db.executescript(self.SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def enqueue(self, paths: list[str], exercises: str,
+                force: bool = False) -> int:
+        """Add jobs (by absolute path); force re-grades finished ones"""
+        if force:
+            sql = ("INSERT INTO jobs (path, exercises) VALUES (?, ?) "
+                   "ON CONFLICT (path) DO UPDATE SET "
+                   "exercises = excluded.exercises, state = 'pending', "
+                   "attempts = 0, lease_token = NULL, result = NULL")
+        else:
+            sql = "INSERT OR IGNORE INTO jobs (path, exercises) VALUES (?, ?)"
+        self.db.execute("BEGIN IMMEDIATE")
+        before = self.db.total_changes
+        self.db.executemany(sql, [(os.path.abspath(path), exercises)
+                                  for path in paths])
+        added = self.db.total_changes - before
+        self.db.execute("COMMIT")
+        return added
+
+    def lease(self, worker: str, visibility: float):
+        """Lease the next available job: (id, token, path, exercises)"""
+        import uuid
+
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose workers died too many times are given up
+            self.db.execute(
+                "UPDATE jobs SET state = 'failed', lease_token = NULL "
+                "WHERE state = 'leased' AND lease_expires < ? "
+                "AND attempts >= ?", (now, self.max_attempts))
+            row = self.db.execute(
+                "SELECT id, path, exercises FROM jobs "
+                "WHERE state = 'pending' "
+                "OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                self.db.execute("COMMIT")
+                return None
+            token = uuid.uuid4().hex
+            self.db.execute(
+                "UPDATE jobs SET state = 'leased', lease_token = ?, "
+                "lease_expires = ?, attempts = attempts + 1, worker = ? "
+                "WHERE id = ?", (token, now + visibility, worker, row[0]))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return row[0], token, row[1], row[2]
+
+    def extend(self, job_id: int, token: str, visibility: float) -> bool:
+        """Renew a lease, False if it was lost to another worker"""
+        cursor = self.db.execute(
+            "UPDATE jobs SET lease_expires = ? "
+            "WHERE id = ? AND lease_token = ? AND state = 'leased'",
+            (time.time() + visibility, job_id, token))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, token: str, result: dict) -> bool:
+        """Store the result of a leased job, once"""
+        cursor = self.db.execute(
+            "UPDATE jobs SET state = 'done', result = ?, finished_at = ?, "
+            "lease_token = NULL "
+            "WHERE id = ? AND lease_token = ? AND state = 'leased'",
+            (json.dumps(result), time.time(), job_id, token))
+        return cursor.rowcount == 1
+
+    def counts(self) -> dict:
+        return dict(self.db.execute(
+            "SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+
+    def results(self):
+        """(path, result) of every finished job"""
+        for path, result in self.db.execute(
+                "SELECT path, result FROM jobs WHERE state = 'done' "
+                "ORDER BY id"):
+            yield path, json.loads(result)
+
+
+def run_queue_worker(queue: GradingQueue, options: dict,
+                     visibility: float, poll: float, wait: bool):
+    """Lease, grade and complete jobs until the queue is drained
+
+    Jobs are graded in a worker process while this one renews the lease
+    between waits for the result: no thread runs next to the grading,
+    which forks sandbox workers.
+    """
+    import socket
+    from concurrent.futures import ProcessPoolExecutor, TimeoutError
+    from concurrent.futures.process import BrokenProcessPool
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    context = grading_context()
+    pool = None
+    graded = 0
+    try:
+        while True:
+            job = queue.lease(worker, visibility)
+            if job is None:
+                counts = queue.counts()
+                if not wait and not counts.get("leased"):
+                    break
+                # Leased jobs may come back if their worker died
+                time.sleep(poll)
+                continue
+
+            job_id, token, path, exercises = job
+            student = archive_stem(path)
+            if pool is None:
+                pool = ProcessPoolExecutor(
+                    max_workers=1, mp_context=context,
+                    initializer=warm_up_worker, initargs=(options,))
+            try:
+                exercise_nums = parse_exercise_list(exercises, get_registry(
+                    options.get("spec"), options.get("cache_dir")))
+                future = pool.submit(grade_submission, path, exercise_nums,
+                                     options)
+                while True:
+                    try:
+                        compliance_results, results, _ = future.result(
+                            timeout=visibility / 3)
+                        break
+                    except TimeoutError:
+                        queue.extend(job_id, token, visibility)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # The worker died (student code without sandbox)
+                    pool = None
+                print(f"❌ {Colors.BOLD}{student}{Colors.END}: "
+                      f"{Colors.RED}Grading crashed: {e}{Colors.END}",
+                      flush=True)
+                continue
+
+            result = {
+                "student": student,
+                "compliance": [dict(r.to_dict(), exercise=r.exercise)
+                               for r in compliance_results],
+                "functional": [dict(r.to_dict(), exercise=r.exercise)
+                               for r in results],
+            }
+            if queue.complete(job_id, token, result):
+                print_student_line(student, compliance_results, results)
+                graded += 1
+            else:
+                print(f"{Colors.YELLOW}{student}: lease lost, result "
+                      f"dropped{Colors.END}", flush=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return graded
+
+
+def queue_main(argv: list[str]):
+    """Entry point of the 'queue' command"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py queue",
+        description="Distribute grading over workers through a SQLite "
+                    "job queue"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="add submissions")
+    enqueue.add_argument("db", help="queue database file")
+    enqueue.add_argument("submissions_dir",
+                         help="folder containing one subfolder per student")
+    enqueue.add_argument("-e", "--exercises", default="all",
+                         help="'all' or comma separated exercise numbers")
+    enqueue.add_argument("--force", action="store_true",
+                         help="re-grade submissions already in the queue")
+    enqueue.add_argument("--spec", metavar="FILE", default=None,
+                         help="JSON exercise spec the exercise numbers "
+                              "refer to")
+
+    work = commands.add_parser("work", help="grade jobs from the queue")
+    work.add_argument("db", help="queue database file")
+    work.add_argument("--visibility", type=float, default=300.0,
+                      help="lease duration in seconds (default: 300)")
+    work.add_argument("--poll", type=float, default=2.0,
+                      help="seconds between polls when idle (default: 2)")
+    work.add_argument("--wait", action="store_true",
+                      help="keep waiting for new jobs once drained")
+    add_tester_arguments(work)
+
+    status = commands.add_parser("status", help="count jobs per state")
+    status.add_argument("db", help="queue database file")
+
+    results = commands.add_parser("results",
+                                  help="print finished results as NDJSON")
+    results.add_argument("db", help="queue database file")
+
+    args = parser.parse_args(argv)
+    queue = GradingQueue(args.db)
+    try:
+        if args.command == "enqueue":
+            try:
+                parse_exercise_list(args.exercises, get_registry(args.spec))
+            except ValueError as e:
+                parser.error(str(e))
+            if not os.path.isdir(args.submissions_dir):
+                parser.error(f"{args.submissions_dir} is not a directory")
+            added = queue.enqueue(find_submissions(args.submissions_dir),
+                                  args.exercises, args.force)
+            print(f"{added} jobs queued in {args.db}")
+        elif args.command == "work":
+            graded = run_queue_worker(queue, tester_options(args),
+                                      args.visibility, args.poll, args.wait)
+            print(f"{Colors.BOLD}{graded} submissions graded{Colors.END}")
+        elif args.command == "status":
+            for state, count in sorted(queue.counts().items()):
+                print(f"{state:<8} {count}")
+        elif args.command == "results":
+            for path, result in queue.results():
+                print(json.dumps(dict(result, path=path),
+                                 ensure_ascii=False))
+    finally:
+        queue.close()
+
+
+def print_rate(label: str, total: int, passed: int):
+    rate = 100 * passed / total if total else 0.0
+    color = Colors.GREEN if passed == total else Colors.RED
+    print(f"{label:<48} {color}{passed:>7}/{total:<7} "
+          f"{rate:5.1f}%{Colors.END}")
+
+
+def stats_main(argv: list[str]):
+    """Entry point of the 'stats' command"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py stats",
+        description="Query results saved with --report sqlite:DB"
+    )
+    parser.add_argument("db", help="result database file")
+    queries = parser.add_subparsers(dest="query", required=True)
+    checks = queries.add_parser("checks", help="pass rate of every check")
+    checks.add_argument("-e", "--exercise",
+                        help="only this exercise folder (e.g. ex6)")
+    queries.add_parser("exercises", help="pass rate of every exercise")
+    failures = queries.add_parser("failures",
+                                  help="most frequent failure messages")
+    failures.add_argument("-e", "--exercise",
+                          help="only this exercise folder (e.g. ex6)")
+    failures.add_argument("-n", "--limit", type=int, default=20,
+                          help="number of rows (default: 20)")
+    history = queries.add_parser("history",
+                                 help="results of a student over time")
+    history.add_argument("student", help="student folder name")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+    store = ResultStore(args.db)
+    try:
+        if args.query == "checks":
+            for exercise, kind, check, total, passed in store.check_rates(
+                    args.exercise):
+                print_rate(f"{exercise} {kind} {check}", total, passed)
+        elif args.query == "exercises":
+            for exercise, total, passed in store.exercise_rates():
+                print_rate(exercise, total, passed)
+        elif args.query == "failures":
+            for exercise, check, reason, count in store.failures(
+                    args.exercise, args.limit):
+                reason = " | ".join(reason.splitlines())
+                print(f"{Colors.RED}{count:>7}{Colors.END} {exercise} "
+                      f"{Colors.BOLD}{check}{Colors.END}: {reason}")
+        elif args.query == "history":
+            for started, exercise, total, passed in store.history(
+                    args.student):
+                when = time.strftime("%Y-%m-%d %H:%M:%S",
+                                     time.localtime(started))
+                print_rate(f"{when} {exercise}", total, passed)
+    finally:
+        store.close()
+
+
+class SimilarityIndex:
+    """Inverted index of AST fingerprints, updated one file at a time
+
+    Candidate pairs are only drawn from fingerprints that a few
+    submissions share: structure common to a large part of the cohort
+    (the natural solution of a short exercise) is treated as boilerplate,
+    which keeps the pair search close to linear in the cohort size.
+    Groups of submissions with the very same structure, too large for
+    the pair search to see, are found from the structure hash of every
+    file instead.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            file TEXT NOT NULL,
+            submission TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            structure TEXT,
+            PRIMARY KEY (file, submission)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            file TEXT NOT NULL,
+            fingerprint INTEGER NOT NULL,
+            submission TEXT NOT NULL,
+            PRIMARY KEY (file, fingerprint, submission)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS fingerprints_submission
+            ON fingerprints (file, submission);
+    """
+
+    def __init__(self, db_path: str):
+        import sqlite3
+
+        self.db = sqlite3.connect(db_path, timeout=60,
+                                  isolation_level=None)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(self.SCHEMA)
+        columns = {row[1] for row in
+                   self.db.execute("PRAGMA table_info(files)")}
+        if "structure" not in columns:
+            # Index written before structure hashes were recorded
+            self.db.execute("ALTER TABLE files ADD COLUMN structure TEXT")
+
+    def close(self):
+        self.db.close()
+
+    def indexed_digest(self, file: str, submission: str):
+        # Rows without a structure hash are reindexed
+        row = self.db.execute(
+            "SELECT digest FROM files WHERE file = ? AND submission = ? "
+            "AND structure IS NOT NULL", (file, submission)).fetchone()
+        return row and row[0]
+
+    def update(self, entries: list[tuple]):
+        """Replace the fingerprints of (file, submission, digest,
+        fingerprints) entries in a single transaction"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for file, submission, digest, fingerprints in entries:
+                self.db.execute(
+                    "DELETE FROM fingerprints "
+                    "WHERE file = ? AND submission = ?", (file, submission))
+                self.db.executemany(
+                    "INSERT INTO fingerprints VALUES (?, ?, ?)",
+                    [(file, fingerprint, submission)
+                     for fingerprint in fingerprints])
+                structure = hashlib.sha256(",".join(
+                    map(str, sorted(set(fingerprints)))).encode()
+                ).hexdigest()
+                self.db.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                    (file, submission, digest, structure))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def prune(self, file: str, submissions: set) -> int:
+        """Forget a file for every submission not in submissions (gone
+        from the folder, or the file went missing)"""
+        stale = [(file, submission) for submission, in self.db.execute(
+            "SELECT submission FROM files WHERE file = ?", (file,))
+            if submission not in submissions]
+        if not stale:
+            return 0
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "DELETE FROM fingerprints "
+                "WHERE file = ? AND submission = ?", stale)
+            self.db.executemany(
+                "DELETE FROM files WHERE file = ? AND submission = ?", stale)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return len(stale)
+
+    def similar_pairs(self, file: str, threshold: float, min_shared: int,
+                      max_share: float):
+        """(submission, submission, score) of every suspicious pair
+
+        The score is the share of the smaller file's fingerprints that
+        the other file has too, counting only uncommon fingerprints.
+        """
+        count, = self.db.execute(
+            "SELECT COUNT(*) FROM files WHERE file = ?", (file,)).fetchone()
+        max_postings = max(5, int(count * max_share))
+        sizes = dict(self.db.execute(
+            "WITH common AS (SELECT fingerprint FROM fingerprints "
+            "WHERE file = ? GROUP BY fingerprint HAVING COUNT(*) > ?) "
+            "SELECT submission, COUNT(*) FROM fingerprints "
+            "WHERE file = ? AND fingerprint NOT IN common "
+            "GROUP BY submission", (file, max_postings, file)))
+        # CROSS JOIN keeps SQLite from pairing up common postings first
+        pairs = self.db.execute(
+            "WITH rare AS (SELECT fingerprint FROM fingerprints "
+            "WHERE file = ? GROUP BY fingerprint "
+            "HAVING COUNT(*) BETWEEN 2 AND ?) "
+            "SELECT a.submission, b.submission, COUNT(*) FROM rare "
+            "CROSS JOIN fingerprints a ON a.file = ? "
+            "AND a.fingerprint = rare.fingerprint "
+            "CROSS JOIN fingerprints b ON b.file = ? "
+            "AND b.fingerprint = rare.fingerprint "
+            "AND a.submission < b.submission "
+            "GROUP BY a.submission, b.submission",
+            (file, max_postings, file, file))
+        for first, second, shared in pairs:
+            score = shared / min(sizes[first], sizes[second])
+            if shared >= min_shared and score >= threshold:
+                yield first, second, score
+
+    def identical_groups(self, file: str, threshold: float,
+                         min_shared: int, max_share: float,
+                         min_solutions: int = 10):
+        """(members, score) of groups with one identical structure that
+        are too large for similar_pairs
+
+        Such a group is only suspicious if its structure is not the
+        natural one. The largest group, or one holding most of the
+        cohort, is the natural solution and never reported; nor is any
+        group of a cohort with fewer than min_solutions distinct
+        solutions, too uniform to tell copies apart. The score is the
+        share of the group's fingerprints found in at most max_share of
+        the distinct solutions (not of the submissions, which a large
+        group defeats by itself).
+        """
+        count, solutions = self.db.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT COALESCE(structure, "
+            "submission)) FROM files WHERE file = ?", (file,)).fetchone()
+        if solutions < min_solutions:
+            return
+        max_postings = max(5, int(count * max_share))
+        max_solutions = max(1, int(solutions * max_share))
+        groups = self.db.execute(
+            "SELECT structure, MIN(submission), COUNT(*) FROM files "
+            "WHERE file = ? AND structure IS NOT NULL "
+            "GROUP BY structure HAVING COUNT(*) > ? "
+            "ORDER BY COUNT(*) DESC", (file, max_postings)).fetchall()
+        largest = self.db.execute(
+            "SELECT COUNT(*) FROM files WHERE file = ? "
+            "GROUP BY COALESCE(structure, submission) "
+            "ORDER BY COUNT(*) DESC LIMIT 1", (file,)).fetchone()[0]
+        for structure, sample, size in groups:
+            if size >= largest or 2 * size > count:
+                continue
+            spread = [row[0] for row in self.db.execute(
+                "SELECT COUNT(DISTINCT COALESCE(s.structure, s.submission)) "
+                "FROM fingerprints mine "
+                "JOIN fingerprints f ON f.file = mine.file "
+                "AND f.fingerprint = mine.fingerprint "
+                "JOIN files s ON s.file = f.file "
+                "AND s.submission = f.submission "
+                "WHERE mine.file = ? AND mine.submission = ? "
+                "GROUP BY mine.fingerprint", (file, sample))]
+            rare = sum(1 for n in spread if n <= max_solutions)
+            if spread and rare >= min_shared and rare / len(spread) >= \
+                    threshold:
+                members = [row[0] for row in self.db.execute(
+                    "SELECT submission FROM files "
+                    "WHERE file = ? AND structure = ? ORDER BY submission",
+                    (file, structure))]
+                yield members, rare / len(spread)
+
+
+def similarity_clusters(pairs) -> list[tuple]:
+    """Group pairs into clusters: (members, best score), largest first"""
+    parent = {}
+
+    def find(item):
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    scores = collections.defaultdict(float)
+    for first, second, score in pairs:
+        parent[find(first)] = find(second)
+        scores[first] = max(scores[first], score)
+        scores[second] = max(scores[second], score)
+
+    groups = collections.defaultdict(list)
+    for item in parent:
+        groups[find(item)].append(item)
+    clusters = [(sorted(members), max(scores[m] for m in members))
+                for members in groups.values()]
+    return sorted(clusters, key=lambda cluster: (-len(cluster[0]),
+                                                 -cluster[1]))
+
+
+def similarity_main(argv: list[str]):
+    """Entry point of the 'similarity' command"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py similarity",
+        description="Flag submissions with near-identical code structure"
+    )
+    parser.add_argument("submissions_dir",
+                        help="folder containing one subfolder per student")
+    parser.add_argument("--index", default="gct-similarity.db",
+                        help="fingerprint index, updated incrementally "
+                             "(default: gct-similarity.db)")
+    parser.add_argument("-e", "--exercises", default="all",
+                        help="'all' or comma separated exercise numbers")
+    parser.add_argument("--threshold", type=float, default=0.8,
+                        help="minimum share of common fingerprints "
+                             "(default: 0.8)")
+    parser.add_argument("--min-shared", type=int, default=4,
+                        help="minimum number of common fingerprints "
+                             "(default: 4)")
+    parser.add_argument("--max-share", type=float, default=0.05,
+                        help="fingerprints found in more than this share "
+                             "of the cohort are ignored (default: 0.05)")
+    parser.add_argument("--min-solutions", type=int, default=10,
+                        help="distinct solutions an exercise needs before "
+                             "identical groups are reported (default: 10)")
+    parser.add_argument("--spec", metavar="FILE", default=None,
+                        help="JSON exercise spec of the curriculum")
+    args = parser.parse_args(argv)
+
+    try:
+        exercise_nums = parse_exercise_list(
+            args.exercises, get_registry(args.spec))
+    except ValueError as e:
+        parser.error(str(e))
+    if not os.path.isdir(args.submissions_dir):
+        parser.error(f"{args.submissions_dir} is not a directory")
+
+    index = SimilarityIndex(args.index)
+    try:
+        updated = 0
+        entries = []
+        present = collections.defaultdict(set)
+        for root in find_submissions(args.submissions_dir):
+            tester = GrowingCodeTester(root=root, quiet=True,
+                                       use_cache=False, spec=args.spec)
+            submission = os.path.abspath(root)
+            for exercise_num in exercise_nums:
+                for file_name, directory in tester.exercise_files(
+                        exercise_num):
+                    digest = tester.file_digest(
+                        tester.exercise_path(file_name, directory))
+                    if digest == "missing":
+                        continue
+                    present[file_name].add(submission)
+                    if digest == index.indexed_digest(file_name, submission):
+                        continue
+                    entries.append((file_name, submission, digest,
+                                    tester.fingerprints(file_name,
+                                                        directory)))
+            if len(entries) >= 1000:
+                index.update(entries)
+                updated += len(entries)
+                entries = []
+        index.update(entries)
+        updated += len(entries)
+
+        catalog = GrowingCodeTester(quiet=True, use_cache=False,
+                                    spec=args.spec)
+        removed = 0
+        for exercise_num in exercise_nums:
+            for file_name, _ in catalog.exercise_files(exercise_num):
+                removed += index.prune(file_name, present[file_name])
+        print(f"{updated} files (re)indexed, {removed} removed "
+              f"in {args.index}")
+
+        flagged = 0
+        for exercise_num in exercise_nums:
+            exercise_name, directory = catalog.exercises[exercise_num]
+            pairs = []
+            groups = {}
+            for file_name, _ in catalog.exercise_files(exercise_num):
+                pairs.extend(index.similar_pairs(
+                    file_name, args.threshold, args.min_shared,
+                    args.max_share))
+                for members, score in index.identical_groups(
+                        file_name, args.threshold, args.min_shared,
+                        args.max_share, args.min_solutions):
+                    key = tuple(members)
+                    groups[key] = max(score, groups.get(key, 0))
+            clusters = similarity_clusters(pairs)
+            groups = sorted(groups.items(), key=lambda group: (
+                -len(group[0]), -group[1]))
+            total = len(clusters) + len(groups)
+            color = Colors.RED if total else Colors.GREEN
+            print(f"\n{Colors.BLUE}{directory} ({exercise_name}){Colors.END}"
+                  f": {color}{total} suspicious clusters{Colors.END}")
+            for members, score in clusters:
+                names = ", ".join(os.path.basename(m) for m in members)
+                print(f"  {Colors.BOLD}{score:.0%}{Colors.END} {names}")
+            for members, score in groups:
+                names = ", ".join(os.path.basename(m) for m in members)
+                print(f"  {Colors.BOLD}{score:.0%}{Colors.END} identical "
+                      f"structure ({len(members)}): {names}")
+            flagged += total
+    finally:
+        index.close()
+    return flagged
+
+
+class GitObjects:
+    """Objects of a repository, read through one git cat-file --batch"""
+
+    def __init__(self, repo: str):
+        import subprocess
+
+        self.repo = repo
+        self.process = subprocess.Popen(
+            ["git", "-C", repo, "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.trees = {}
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+    def read(self, sha: str):
+        """(type, content) of an object"""
+        self.process.stdin.write(f"{sha}\n".encode())
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            raise KeyError(f"Unknown git object: {sha}")
+        size = int(header[2])
+        data = self.process.stdout.read(size)
+        self.process.stdout.read(1)  # Trailing newline
+        return header[1].decode(), data
+
+    def tree(self, sha: str) -> dict:
+        """{name: sha} of a tree, parsed once per tree"""
+        if sha not in self.trees:
+            _, data = self.read(sha)
+            entries = {}
+            position = 0
+            # Entries are "<mode> <name>\0<20 byte sha>"
+            while position < len(data):
+                end = data.index(b"\0", position)
+                _, name = data[position:end].split(b" ", 1)
+                entries[name.decode(errors="replace")] = data[
+                    end + 1:end + 21].hex()
+                position = end + 21
+            self.trees[sha] = entries
+        return self.trees[sha]
+
+    def commit(self, sha: str):
+        """(tree sha, commit time, subject) of a commit"""
+        _, data = self.read(sha)
+        headers, _, message = data.decode(errors="replace").partition(
+            "\n\n")
+        tree, committed = None, 0
+        for line in headers.splitlines():
+            if line.startswith("tree "):
+                tree = line[5:]
+            elif line.startswith("committer "):
+                committed = int(line.rsplit(" ", 2)[1])
+        return tree, committed, message.split("\n", 1)[0]
+
+    def path(self, tree: str, path: str):
+        """sha of the object at path inside a tree, None if absent"""
+        sha = tree
+        for part in path.split("/"):
+            if not part:
+                continue
+            sha = self.tree(sha).get(part) if sha else None
+        return sha
+
+
+def print_commit_line(sha: str, committed: int, subject: str,
+                      compliance_results: list[TestResult],
+                      results: list[TestResult], changed: list[int]):
+    """One timeline line per commit"""
+    compliance_passed = sum(1 for r in compliance_results if r.passed)
+    functional_passed = sum(1 for r in results if r.passed)
+    passed = (compliance_passed == len(compliance_results) and
+              functional_passed == len(results))
+    icon, color = STATUS_STYLES[passed]
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(committed))
+    regraded = (f" (graded ex{', ex'.join(map(str, changed))})"
+                if changed else "")
+    print(f"{icon} {Colors.YELLOW}{sha[:10]}{Colors.END} {when} "
+          f"{color}compliance {compliance_passed}/{len(compliance_results)}"
+          f", functional {functional_passed}/{len(results)}{Colors.END} "
+          f"{Colors.BOLD}{subject}{Colors.END}{regraded}", flush=True)
+
+
+def grade_git_history(repo: str, rev: str, subdir: str,
+                      exercise_nums: list[int], tester_options: dict,
+                      reporters: list[Reporter] = ()):
+    """Grade every commit of a repository, each distinct file once"""
+    import subprocess
+
+    commits = subprocess.run(
+        ["git", "-C", repo, "rev-list", "--reverse", "--topo-order", rev],
+        capture_output=True, text=True, check=True).stdout.split()
+    objects = GitObjects(repo)
+    name = os.path.basename(os.path.abspath(repo))
+    catalog = GrowingCodeTester(quiet=True, use_cache=False,
+                                spec=tester_options.get("spec"))
+    graded = {}
+    blobs = {}
+    gradings = 0
+    profiler = (Profiler() if tester_options.get("profile")
+                else NULL_PROFILER)
+
+    try:
+        for sha in commits:
+            tree, committed, subject = objects.commit(sha)
+            root = objects.path(tree, subdir)
+            # Blob shas of each exercise's files identify what to grade
+            exercise_blobs = {
+                exercise_num: tuple(
+                    objects.path(root, f"{directory}/{file_name}.py")
+                    for file_name, directory in catalog.exercise_files(
+                        exercise_num))
+                for exercise_num in exercise_nums
+            }
+            changed = [exercise_num for exercise_num in exercise_nums
+                       if (exercise_num, exercise_blobs[exercise_num])
+                       not in graded]
+
+            if changed:
+                members = {}
+                for exercise_num in changed:
+                    for (file_name, directory), blob in zip(
+                            catalog.exercise_files(exercise_num),
+                            exercise_blobs[exercise_num]):
+                        if blob is None:
+                            continue
+                        if blob not in blobs:
+                            blobs[blob] = objects.read(blob)[1]
+                        members[f"{directory}/{file_name}.py"] = blobs[blob]
+                snapshot = os.path.join(os.path.abspath(repo), subdir,
+                                        f"@{sha[:10]}")
+                tester = GrowingCodeTester(
+                    root=snapshot, quiet=True,
+                    files=MemoryFiles(snapshot, members), **tester_options)
+                tester.run_tests(changed)
+                profiler.merge(tester.profiler.samples)
+                for exercise_num in changed:
+                    _, directory = catalog.exercises[exercise_num]
+                    graded[exercise_num, exercise_blobs[exercise_num]] = (
+                        [r for r in tester.compliance_results
+                         if r.exercise == directory],
+                        [r for r in tester.results
+                         if r.exercise == directory])
+                gradings += len(changed)
+
+            student = f"{name}@{sha[:10]}"
+            compliance_results, results = [], []
+            for exercise_num in exercise_nums:
+                compliance, functional = graded[
+                    exercise_num, exercise_blobs[exercise_num]]
+                compliance_results.extend(compliance)
+                results.extend(functional)
+            for reporter in reporters:
+                for result in compliance_results:
+                    reporter.record(student, "compliance", result)
+                for result in results:
+                    reporter.record(student, "functional", result)
+            print_commit_line(sha, committed, subject, compliance_results,
+                              results, changed)
+    finally:
+        objects.close()
+
+    print(f"\n{Colors.BOLD}{len(commits)} commits, {gradings} exercise "
+          f"gradings instead of {len(commits) * len(exercise_nums)}"
+          f"{Colors.END}")
+    if profiler.enabled:
+        profiler.print_table()
+    return len(commits)
+
+
+def git_main(argv: list[str]):
+    """Entry point of the 'git' command"""
+    import argparse
+    import subprocess
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py git",
+        description="Grade every commit of a student repository without "
+                    "checking any of them out"
+    )
+    parser.add_argument("repo", help="local git repository")
+    parser.add_argument("--rev", default="HEAD",
+                        help="history to walk (default: HEAD)")
+    parser.add_argument("--path", default="",
+                        help="folder holding ex0..ex7 inside the "
+                             "repository (default: its root)")
+    parser.add_argument("-e", "--exercises", default="all",
+                        help="'all' or comma separated exercise numbers")
+    add_tester_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        exercise_nums = parse_exercise_list(
+            args.exercises, get_registry(args.spec, args.cache_dir))
+    except ValueError as e:
+        parser.error(str(e))
+    reporters = open_reporters(parser, args)
+    try:
+        grade_git_history(args.repo, args.rev, args.path.strip("/"),
+                          exercise_nums, tester_options(args), reporters)
+    except subprocess.CalledProcessError as e:
+        parser.error(e.stderr.strip() or f"git exited with {e.returncode}")
+    finally:
+        close_reporters(reporters)
+
+
+def run_single(tester: GrowingCodeTester, target: str):
+    """Grade the exercises of the current directory and print a summary"""
     tester.print_header()
 
-    if len(sys.argv) > 1:
-        arg = sys.argv[1]
+    if target is not None:
+        arg = target
         if arg == "all":
-            for i in range(8):
-                tester.run_test(i)
+            tester.run_tests(list(tester.exercises))
         else:
             try:
                 exercise_num = int(arg)
-                if 0 <= exercise_num <= 7:
+                if exercise_num in tester.exercises:
                     tester.run_test(exercise_num)
                 else:
                     print(f"{Colors.RED}Error: Exercise number must be "
-                          f"between 0 and 7{Colors.END}")
+                          f"one of {tester.registry.bounds()}{Colors.END}")
                     return
             except ValueError:
                 print(f"{Colors.RED}Error: Invalid exercise number '{arg}'"
                       f"{Colors.END}")
                 return
     else:
-        print("Usage: python3 growingcodetester.py [0-7|all]")
+        print(f"Usage: python3 growingcodetester.py "
+              f"[{tester.registry.bounds()}|all]")
         print("\nAvailable exercises:")
         for num, (name, _) in tester.exercises.items():
             print(f"  {num} - {name}")
         print("  all - Run all tests")
+        print("\nBatch mode:")
+        print("  python3 growingcodetester.py batch SUBMISSIONS_DIR "
+              "[--jobs N]")
+        print("\nGrading server:")
+        print("  python3 growingcodetester.py serve [--socket PATH]")
+        print("  python3 growingcodetester.py client [PATH] "
+              "[--socket PATH]")
+        return
+
+    with tester.profiler.phase("report"):
+        tester.print_summary()
+    if tester.profiler.enabled:
+        tester.profiler.print_table()
+
+
+def run_watch(tester: GrowingCodeTester, exercise_nums: list[int],
+              interval: float = 0.2):
+    """Stay resident and re-grade only the exercises whose files change"""
+    tester.quiet = True
+    stamps = {}
+    exercise_results = {}
+
+    try:
+        while True:
+            changed = [exercise_num for exercise_num in exercise_nums
+                       if tester.file_stamps(exercise_num) !=
+                       stamps.get(exercise_num)]
+            if changed:
+                start = time.perf_counter()
+                for exercise_num in changed:
+                    # Stamp first so a save during the run is seen later
+                    stamps[exercise_num] = tester.file_stamps(exercise_num)
+                    tester.forget(exercise_num)
+                tester.prelint(changed)
+                for exercise_num in changed:
+                    tester.compliance_results = []
+                    tester.results = []
+                    tester.run_test(exercise_num)
+                    exercise_results[exercise_num] = (
+                        tester.compliance_results, tester.results)
+                elapsed = time.perf_counter() - start
+
+                tester.compliance_results = [
+                    result for exercise_num in sorted(exercise_results)
+                    for result in exercise_results[exercise_num][0]]
+                tester.results = [
+                    result for exercise_num in sorted(exercise_results)
+                    for result in exercise_results[exercise_num][1]]
+
+                print(Colors.CLEAR, end="")
+                tester.print_header()
+                names = ", ".join(tester.exercises[exercise_num][0]
+                                  for exercise_num in changed)
+                print(f"{Colors.BLUE}Re-graded {names} in "
+                      f"{elapsed * 1000:.0f} ms{Colors.END}")
+                tester.print_summary()
+                print(f"\n{Colors.CYAN}Watching for changes... "
+                      f"(Ctrl+C to stop){Colors.END}", flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print()
+
+
+COMMANDS = {
+    "batch": batch_main,
+    "serve": serve_main,
+    "client": client_main,
+    "queue": queue_main,
+    "stats": stats_main,
+    "similarity": similarity_main,
+    "git": git_main,
+}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="growingcodetester.py",
+        description="Automated testing suite for Growing Code exercises"
+    )
+    parser.add_argument("target", nargs="?",
+                        help="exercise number or 'all'")
+    parser.add_argument("--watch", action="store_true",
+                        help="stay running and re-grade exercises as "
+                             "their files change")
+    parser.add_argument("--interval", type=float, default=0.2,
+                        help="seconds between file checks in --watch "
+                             "mode (default: 0.2)")
+    add_tester_arguments(parser)
+    args = parser.parse_args()
+    try:
+        get_registry(args.spec, args.cache_dir)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.watch:
+        if args.target is None:
+            parser.error("--watch needs an exercise number or 'all'")
+        try:
+            exercise_nums = parse_exercise_list(
+                args.target, get_registry(args.spec, args.cache_dir))
+        except ValueError as e:
+            parser.error(str(e))
+        run_watch(GrowingCodeTester(**tester_options(args)), exercise_nums,
+                  args.interval)
         return
 
-    tester.print_summary()
+    reporters = open_reporters(parser, args)
+    tester = GrowingCodeTester(reporters=reporters, **tester_options(args))
+    profile = None
+    if args.profile_dump:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        run_single(tester, args.target)
+    finally:
+        close_reporters(reporters)
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(args.profile_dump)
 
 
 if __name__ == "__main__":